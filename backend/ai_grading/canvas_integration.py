@@ -4,12 +4,32 @@ Canvas LMS Integration for AI Grading
 Handles fetching submissions from Canvas and posting grades back.
 """
 
+import re
+import http.cookiejar
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Shared keep-alive pool for all Canvas calls. Auth headers are passed
+# per request, so one pool can serve every user and Canvas host. Cookies
+# are never stored, otherwise cookies Canvas sets for one user's token
+# would be sent along with the next user's requests to that host
+canvas_http = requests.Session()
+canvas_http.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+canvas_http.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504)
+    )
+))
+
 
 class CanvasGradingIntegration:
     """
@@ -54,7 +74,7 @@ class CanvasGradingIntegration:
         }
 
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
+            response = canvas_http.get(url, headers=self.headers, params=params, timeout=30)
             response.raise_for_status()
 
             assignment = response.json()
@@ -99,7 +119,7 @@ class CanvasGradingIntegration:
         }
 
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
+            response = canvas_http.get(url, headers=self.headers, params=params, timeout=30)
             response.raise_for_status()
 
             submissions = response.json()
@@ -159,7 +179,6 @@ class CanvasGradingIntegration:
         if submission_type == "online_text_entry":
             body = submission.get("body", "")
             # Strip HTML tags (basic)
-            import re
             text = re.sub(r'<[^>]+>', '', body)
             text = text.replace('&nbsp;', ' ').replace('&amp;', '&')
             return text.strip()
@@ -222,7 +241,7 @@ class CanvasGradingIntegration:
             data["rubric_assessment"] = rubric_assessment
 
         try:
-            response = requests.put(url, headers=self.headers, json=data, timeout=30)
+            response = canvas_http.put(url, headers=self.headers, json=data, timeout=30)
             response.raise_for_status()
 
             logger.info(f"Posted grade {score} for student {student_id}")
@@ -321,7 +340,7 @@ class CanvasGradingIntegration:
         }
 
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
+            response = canvas_http.get(url, headers=self.headers, params=params, timeout=30)
             response.raise_for_status()
 
             assignments = response.json()
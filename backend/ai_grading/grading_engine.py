@@ -6,14 +6,45 @@ Core engine for grading student submissions using GROQ's Llama 3.3 70B model.
 
 import asyncio
 import json
+import orjson
 import re
 import os
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from groq import AsyncGroq
 
 # Initialize GROQ client
 groq_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"))
 
+# Patterns for pulling the JSON payload out of AI replies, compiled once
+# at import instead of going through re's cache on every parse
+JSON_CODE_BLOCK_RE = re.compile(r'```json\n(.*?)\n```', re.DOTALL)
+JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+
+# Stock phrases that show up often in AI-written text, matched by
+# _detect_ai_content() in a single pass over the submission
+AI_PHRASES = (
+    "it is important to note",
+    "it is worth mentioning",
+    "it's important to note",
+    "furthermore",
+    "moreover",
+    "in conclusion",
+    "to summarize",
+    "delve into",
+    "dive into",
+    "comprehensive understanding",
+    "multifaceted"
+)
+AI_PHRASES_RE = re.compile("|".join(re.escape(phrase) for phrase in AI_PHRASES))
+
+# Single-word markers, checked against the submission's word set
+WORD_RE = re.compile(r"[a-z']+")
+PERSONAL_WORDS = frozenset({"i", "my", "me", "we", "our", "us"})
+FORMAL_WORDS = frozenset({"thus", "hence", "thereby", "wherein", "aforementioned", "subsequently"})
+# Typos human writers make and AI text rarely has (substring matches)
+COMMON_TYPOS = ("teh ", "adn ", "recieve", "seperate", "definately")
+
 
 class AIGradingEngine:
     """
@@ -27,6 +58,12 @@ class AIGradingEngine:
     - Detects potential AI-generated content
     """
 
+    # Submissions packed into one grading prompt by grade_batch()
+    BATCH_SIZE = 5
+    BATCH_MAX_CHARS = 24000
+    # Grading calls allowed in flight at once from grade_batch()
+    MAX_CONCURRENCY = 8
+
     def __init__(self, rubric: Dict, preferences: Optional[Dict] = None):
         """
         Initialize grading engine
@@ -134,24 +171,7 @@ class AIGradingEngine:
                 response.choices[0].message.content
             )
 
-            # Check for parsing errors
-            if "error" in result:
-                return {
-                    **result,
-                    "confidence": "low",
-                    "flags": ["parse_error"]
-                }
-
-            # Add confidence assessment
-            result["confidence"] = self._assess_confidence(result, submission_text)
-
-            # Add flags
-            result["flags"] = self._generate_flags(
-                submission_text,
-                result
-            )
-
-            return result
+            return self._finalize_result(result, submission_text)
 
         except Exception as e:
             print(f"AI Grading error: {e}")
@@ -161,8 +181,110 @@ class AIGradingEngine:
                 "flags": ["api_error"]
             }
 
-    def _get_system_prompt(self) -> str:
-        """Generate system prompt for AI grader"""
+    async def grade_chunk(self, submissions: List[Dict]) -> List[Dict]:
+        """
+        Grade several submissions with a single AI call
+
+        Each submission is wrapped in <<<SUB i>>> ... <<<END>>> markers and the
+        model returns a JSON array with one grading object per index. The
+        reply is only used if it has exactly one valid entry for every
+        index in the chunk; otherwise the whole chunk is graded one
+        submission at a time, so a grade can never land on the wrong student.
+
+        Returns:
+            List of grading results in the same order as submissions
+        """
+
+        # Empty submissions are rejected by grade_submission() without an AI call
+        batchable = [
+            i for i, sub in enumerate(submissions)
+            if len((sub.get("submission_text") or "").strip()) >= 10
+        ]
+
+        graded = {}
+
+        if len(batchable) > 1:
+            prompt = self._build_batch_grading_prompt(
+                [submissions[i] for i in batchable]
+            )
+
+            try:
+                response = await groq_client.chat.completions.create(
+                    model="llama-3.3-70b-versatile",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": self._get_batch_system_prompt()
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    temperature=0.3,
+                    max_tokens=min(2048 * len(batchable), 8192),
+                    top_p=0.9
+                )
+
+                parsed = self._parse_batch_response(
+                    response.choices[0].message.content
+                )
+                if parsed is not None and set(parsed) == set(range(len(batchable))):
+                    graded = {
+                        batchable[index]: result
+                        for index, result in parsed.items()
+                    }
+                else:
+                    print("AI batch reply did not match the chunk, grading individually")
+
+            except Exception as e:
+                print(f"AI batch grading error: {e}")
+
+        # Anything not covered by the batch reply is graded on its own,
+        # in parallel
+        ungraded = [i for i in range(len(submissions)) if i not in graded]
+        individual = await asyncio.gather(*[
+            self.grade_submission(
+                submission_text=submissions[i].get("submission_text", ""),
+                student_name=submissions[i].get("student_name")
+            )
+            for i in ungraded
+        ])
+        individual_results = dict(zip(ungraded, individual))
+
+        results = []
+        for i, sub in enumerate(submissions):
+            if i in graded:
+                results.append(self._finalize_result(graded[i], sub.get("submission_text", "")))
+            else:
+                results.append(individual_results[i])
+
+        return results
+
+    def _finalize_result(self, result: Dict, submission_text: str) -> Dict:
+        """Add confidence and flags to a parsed grading result"""
+
+        # Check for parsing errors
+        if "error" in result:
+            return {
+                **result,
+                "confidence": "low",
+                "flags": ["parse_error"]
+            }
+
+        # Add confidence assessment
+        result["confidence"] = self._assess_confidence(result, submission_text)
+
+        # Add flags
+        result["flags"] = self._generate_flags(
+            submission_text,
+            result
+        )
+
+        return result
+
+    def _get_grading_philosophy(self) -> str:
+        """Role and grading philosophy shared by the single and batch prompts"""
 
         strictness = self.strictness_map.get(
             self.preferences.get("strictness", "balanced"),
@@ -177,21 +299,26 @@ GRADING PHILOSOPHY:
 - Be specific about strengths and areas for improvement
 - Maintain consistent standards across all submissions
 - Focus on the rubric criteria provided
-- Be fair and objective
+- Be fair and objective"""
+
+    def _get_system_prompt(self) -> str:
+        """Generate system prompt for AI grader"""
+
+        return self._get_grading_philosophy() + """
 
 OUTPUT FORMAT:
 You MUST return your grading as valid JSON with this EXACT structure:
-{{
-  "rubric_scores": {{
+{
+  "rubric_scores": {
     "Criterion Name": score_number,
     "Another Criterion": score_number
-  }},
-  "criterion_feedback": {{
+  },
+  "criterion_feedback": {
     "Criterion Name": "1-2 sentences of specific feedback for this criterion",
     "Another Criterion": "1-2 sentences of specific feedback"
-  }},
+  },
   "overall_feedback": "2-3 sentences of overall feedback addressing the student directly"
-}}
+}
 
 CRITICAL RULES:
 - Scores MUST be numbers (integers or decimals), NOT strings
@@ -201,6 +328,76 @@ CRITICAL RULES:
 - Address the student directly using "you" and their name if provided
 - Return ONLY the JSON, no extra text before or after"""
 
+    def _get_batch_system_prompt(self) -> str:
+        """System prompt for grading several submissions in one call"""
+
+        return self._get_grading_philosophy() + """
+
+BATCH GRADING:
+- You will receive several submissions, each between <<<SUB i>>> and <<<END>>> markers
+- Grade every submission independently against the same rubric
+
+OUTPUT FORMAT:
+You MUST return a JSON array with exactly one object per submission, using this EXACT structure:
+[
+  {
+    "index": i,
+    "rubric_scores": {
+      "Criterion Name": score_number,
+      "Another Criterion": score_number
+    },
+    "criterion_feedback": {
+      "Criterion Name": "1-2 sentences of specific feedback for this criterion",
+      "Another Criterion": "1-2 sentences of specific feedback"
+    },
+    "overall_feedback": "2-3 sentences of overall feedback addressing the student directly"
+  }
+]
+
+CRITICAL RULES:
+- "index" MUST be the exact number i from that submission's <<<SUB i>>> marker
+- Scores MUST be numbers (integers or decimals), NOT strings
+- Criterion names in rubric_scores and criterion_feedback MUST match exactly
+- Feedback should be 1-3 sentences per criterion
+- Overall feedback should be encouraging but honest
+- Address each student directly using "you" and their name if provided
+- Return ONLY the JSON array, no extra text before or after"""
+
+    def _format_rubric(self) -> str:
+        """Format rubric criteria for grading prompts"""
+
+        rubric_text = "GRADING RUBRIC:\n"
+        for criterion in self.rubric.get("criteria", []):
+            rubric_text += f"\n{criterion['name']} ({criterion['points']} points maximum):\n"
+            rubric_text += f"  Description: {criterion['description']}\n"
+
+        return rubric_text
+
+    def _build_batch_grading_prompt(self, submissions: List[Dict]) -> str:
+        """Build one grading prompt covering several submissions"""
+
+        total_points = sum(c['points'] for c in self.rubric.get("criteria", []))
+
+        blocks = []
+        for i, sub in enumerate(submissions):
+            student_name = sub.get("student_name")
+            blocks.append(
+                f"<<<SUB {i}>>>\n"
+                f"{'STUDENT NAME: ' + student_name if student_name else ''}\n"
+                f"{sub.get('submission_text', '')}\n"
+                f"<<<END>>>"
+            )
+
+        return f"""{self._format_rubric()}
+
+TOTAL POSSIBLE POINTS: {total_points}
+
+SUBMISSIONS TO GRADE ({len(submissions)}):
+
+{chr(10).join(blocks)}
+
+Please grade each submission according to the rubric above. Return a JSON array with one grading object per submission, each including its "index"."""
+
     def _build_grading_prompt(
         self,
         submission_text: str,
@@ -208,11 +405,7 @@ CRITICAL RULES:
     ) -> str:
         """Build the grading prompt with rubric and submission"""
 
-        # Format rubric
-        rubric_text = "GRADING RUBRIC:\n"
-        for criterion in self.rubric.get("criteria", []):
-            rubric_text += f"\n{criterion['name']} ({criterion['points']} points maximum):\n"
-            rubric_text += f"  Description: {criterion['description']}\n"
+        rubric_text = self._format_rubric()
 
         total_points = sum(c['points'] for c in self.rubric.get("criteria", []))
 
@@ -236,33 +429,19 @@ Please grade this submission according to the rubric above. Provide a score for
 
         # Extract JSON from response
         # AI sometimes wraps JSON in markdown code blocks
-        json_match = re.search(r'```json\n(.*?)\n```', response_text, re.DOTALL)
+        json_match = JSON_CODE_BLOCK_RE.search(response_text)
         if json_match:
             json_text = json_match.group(1)
         else:
             # Try to find JSON directly
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+            json_match = JSON_OBJECT_RE.search(response_text)
             json_text = json_match.group(0) if json_match else response_text
 
         try:
-            parsed = json.loads(json_text)
-
-            # Validate structure
-            if "rubric_scores" not in parsed:
-                return {"error": "Missing rubric_scores in AI response"}
+            parsed = orjson.loads(json_text)
+            return self._build_result(parsed)
 
-            # Calculate total score
-            scores = parsed.get("rubric_scores", {})
-            total_score = sum(float(score) for score in scores.values())
-
-            return {
-                "total_score": round(total_score, 2),
-                "rubric_scores": scores,
-                "criterion_feedback": parsed.get("criterion_feedback", {}),
-                "feedback": parsed.get("overall_feedback", "")
-            }
-
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             print(f"Failed to parse AI response as JSON: {e}")
             print(f"Response text: {response_text[:500]}")
 
@@ -276,6 +455,64 @@ Please grade this submission according to the rubric above. Provide a score for
                 "error": f"Error processing response: {str(e)}"
             }
 
+    def _parse_batch_response(self, response_text: str) -> Optional[Dict[int, Dict]]:
+        """
+        Parse a batch grading reply into {index: result}
+
+        Returns None if the reply can't be trusted as a whole: bad JSON,
+        a malformed or failed entry, or a repeated index
+        """
+
+        json_match = JSON_CODE_BLOCK_RE.search(response_text)
+        if json_match:
+            json_text = json_match.group(1)
+        else:
+            json_match = JSON_ARRAY_RE.search(response_text)
+            json_text = json_match.group(0) if json_match else response_text
+
+        try:
+            parsed = orjson.loads(json_text)
+        except orjson.JSONDecodeError as e:
+            print(f"Failed to parse AI batch response as JSON: {e}")
+            return None
+
+        if not isinstance(parsed, list):
+            return None
+
+        graded = {}
+        for item in parsed:
+            if not isinstance(item, dict) or "index" not in item:
+                return None
+            try:
+                index = int(item["index"])
+                result = self._build_result(item)
+            except (TypeError, ValueError, AttributeError) as e:
+                print(f"Malformed batch entry: {e}")
+                return None
+            if "error" in result or index in graded:
+                return None
+            graded[index] = result
+
+        return graded
+
+    def _build_result(self, parsed: Dict) -> Dict:
+        """Turn one parsed grading object into a result dict"""
+
+        # Validate structure
+        if "rubric_scores" not in parsed:
+            return {"error": "Missing rubric_scores in AI response"}
+
+        # Calculate total score
+        scores = parsed.get("rubric_scores", {})
+        total_score = sum(float(score) for score in scores.values())
+
+        return {
+            "total_score": round(total_score, 2),
+            "rubric_scores": scores,
+            "criterion_feedback": parsed.get("criterion_feedback", {}),
+            "feedback": parsed.get("overall_feedback", "")
+        }
+
     def _assess_confidence(self, result: Dict, submission_text: str) -> str:
         """
         Assess confidence in AI grading
@@ -389,7 +626,8 @@ Please grade this submission according to the rubric above. Provide a score for
 
         return flags
 
-    def _detect_ai_content(self, text: str) -> float:
+    @staticmethod
+    def _detect_ai_content(text: str) -> float:
         """
         Simple AI-generated content detector
 
@@ -416,43 +654,41 @@ Please grade this submission according to the rubric above. Provide a score for
                 if variance < avg_length * 0.3:  # Low variance = too uniform
                     indicators += 0.5
 
-        # 2. Check for common AI phrases
-        ai_phrases = [
-            "it is important to note",
-            "it is worth mentioning",
-            "it's important to note",
-            "furthermore",
-            "moreover",
-            "in conclusion",
-            "to summarize",
-            "delve into",
-            "dive into",
-            "comprehensive understanding",
-            "multifaceted"
-        ]
+        # 2. Check for common AI phrases (distinct phrases, one scan).
+        # Three phrases already earns the full point, so stop there
         text_lower = text.lower()
-        phrase_count = sum(1 for phrase in ai_phrases if phrase in text_lower)
+        found_phrases = set()
+        for match in AI_PHRASES_RE.finditer(text_lower):
+            found_phrases.add(match.group(0))
+            if len(found_phrases) >= 3:
+                break
+        phrase_count = len(found_phrases)
         if phrase_count >= 3:
             indicators += 1.0
         elif phrase_count >= 2:
             indicators += 0.5
 
+        # Words in the submission, for the whole-word checks below
+        words = set(WORD_RE.findall(text_lower))
+
         # 3. Check for lack of personal voice
-        personal_markers = [" i ", " my ", " me ", " we ", " our ", " us "]
-        has_personal_voice = any(marker in text_lower for marker in personal_markers)
+        has_personal_voice = not words.isdisjoint(PERSONAL_WORDS)
         if not has_personal_voice and len(text) > 300:
             indicators += 0.5
 
         # 4. Check for overly perfect grammar (no common typos)
-        common_typos = ["teh ", "adn ", "recieve", "seperate", "definately"]
-        has_typos = any(typo in text_lower for typo in common_typos)
-        if not has_typos and len(text) > 500:
-            indicators += 0.3
+        # (only long submissions count, so short ones skip the scan)
+        if len(text) > 500:
+            has_typos = any(typo in text_lower for typo in COMMON_TYPOS)
+            if not has_typos:
+                indicators += 0.3
 
         # 5. Check sentence structure variety
         sentences = text.split(".")
         if len(sentences) > 5:
-            sentence_lengths = [len(s.split()) for s in sentences if len(s.strip()) > 0]
+            # Whitespace-only pieces split into no words, so one split()
+            # per sentence both filters and counts
+            sentence_lengths = [n for n in map(len, map(str.split, sentences)) if n]
             if sentence_lengths:
                 avg_sent_length = sum(sentence_lengths) / len(sentence_lengths)
                 # AI tends toward consistent 15-25 word sentences
@@ -460,8 +696,7 @@ Please grade this submission according to the rubric above. Provide a score for
                     indicators += 0.5
 
         # 6. Check for overly formal academic language
-        formal_words = ["thus", "hence", "thereby", "wherein", "aforementioned", "subsequently"]
-        formal_count = sum(1 for word in formal_words if word in text_lower)
+        formal_count = len(words & FORMAL_WORDS)
         if formal_count >= 2:
             indicators += 0.5
 
@@ -471,11 +706,17 @@ Please grade this submission according to the rubric above. Provide a score for
 
     async def grade_batch(
         self,
-        submissions: List[Dict]
+        submissions: List[Dict],
+        on_chunk_graded: Optional[Callable[[List[Dict], List[Dict]], None]] = None
     ) -> List[Dict]:
         """
         Grade multiple submissions in parallel
 
+        Submissions are packed BATCH_SIZE at a time (capped at
+        BATCH_MAX_CHARS of text) into one AI call each, so the prompt
+        preamble and request overhead are shared across the chunk.
+        At most MAX_CONCURRENCY chunks are graded at once.
+
         Args:
             submissions: List of dicts with structure:
                 [
@@ -487,39 +728,75 @@ Please grade this submission according to the rubric above. Provide a score for
                     },
                     ...
                 ]
+            on_chunk_graded: Optional callback, called with (chunk
+                submissions, chunk results) as soon as each chunk is
+                graded, e.g. to save progress. Errors it raises propagate
 
         Returns:
             List of grading results (one per submission)
         """
 
-        # Grade submissions in parallel using asyncio
-        tasks = [
-            self.grade_submission(
-                submission_text=sub.get("submission_text", ""),
-                student_name=sub.get("student_name")
-            )
-            for sub in submissions
-        ]
-
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        chunks = self._chunk_submissions(submissions)
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
 
-        # Add submission metadata to results
-        for i, result in enumerate(results):
-            # Handle exceptions
-            if isinstance(result, Exception):
-                results[i] = {
-                    "error": str(result),
-                    "confidence": "low",
-                    "flags": ["exception_during_grading"]
-                }
-                result = results[i]
+        async def grade_chunk_limited(chunk: List[Dict]) -> List[Dict]:
+            async with semaphore:
+                try:
+                    chunk_results = await self.grade_chunk(chunk)
+                except Exception as e:
+                    # Handle exceptions
+                    chunk_results = [
+                        {
+                            "error": str(e),
+                            "confidence": "low",
+                            "flags": ["exception_during_grading"]
+                        }
+                        for _ in chunk
+                    ]
 
             # Add submission IDs
-            result["submission_id"] = submissions[i].get("submission_id")
-            result["student_id"] = submissions[i].get("student_id")
-            result["student_name"] = submissions[i].get("student_name")
+            for submission, result in zip(chunk, chunk_results):
+                result["submission_id"] = submission.get("submission_id")
+                result["student_id"] = submission.get("student_id")
+                result["student_name"] = submission.get("student_name")
 
-        return results
+            if on_chunk_graded:
+                on_chunk_graded(chunk, chunk_results)
+
+            return chunk_results
+
+        # Grade chunks in parallel, at most MAX_CONCURRENCY at a time
+        tasks = [grade_chunk_limited(chunk) for chunk in chunks]
+
+        chunk_results = await asyncio.gather(*tasks)
+
+        return [result for chunk_result in chunk_results for result in chunk_result]
+
+    def _chunk_submissions(self, submissions: List[Dict]) -> List[List[Dict]]:
+        """Split submissions into chunks for grade_chunk()"""
+
+        chunks = []
+        current = []
+        current_chars = 0
+
+        for sub in submissions:
+            text_length = len(sub.get("submission_text", "") or "")
+
+            if current and (
+                len(current) >= self.BATCH_SIZE or
+                current_chars + text_length > self.BATCH_MAX_CHARS
+            ):
+                chunks.append(current)
+                current = []
+                current_chars = 0
+
+            current.append(sub)
+            current_chars += text_length
+
+        if current:
+            chunks.append(current)
+
+        return chunks
 
     async def regenerate_feedback(
         self,
@@ -8,7 +8,18 @@ Based on: Canvas API OAuth documentation
 
 import requests
 from typing import Dict, Optional
+import hashlib
 import os
+import threading
+
+from cachetools import TTLCache
+
+# Decrypted tokens keyed by a digest of the ciphertext. Reconnecting
+# stores a new ciphertext, so stale entries are never hit
+decrypted_token_cache = TTLCache(maxsize=10_000, ttl=300)
+# TTLCache isn't thread-safe; decrypt_token is called from the event loop
+# and from threadpool dependencies at the same time
+decrypted_token_cache_lock = threading.Lock()
 
 
 class CanvasAuth:
@@ -158,6 +169,17 @@ def decrypt_token(encrypted_token: str) -> str:
     Returns:
         str: Decrypted token
     """
+    key = hashlib.blake2b(encrypted_token.encode(), digest_size=16).digest()
+    with decrypted_token_cache_lock:
+        token = decrypted_token_cache.get(key)
+    if token is None:
+        token = _decrypt_token(encrypted_token)
+        with decrypted_token_cache_lock:
+            decrypted_token_cache[key] = token
+    return token
+
+
+def _decrypt_token(encrypted_token: str) -> str:
     # TODO: Implement proper decryption
     encryption_key = os.getenv("ENCRYPTION_KEY")
     if not encryption_key:
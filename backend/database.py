@@ -6,7 +6,7 @@ Built for: ReadySetClass v2.0
 Database: PostgreSQL (Railway)
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, JSON, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -18,7 +18,17 @@ if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     # Railway uses postgres://, but SQLAlchemy needs postgresql://
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URL) if DATABASE_URL else None
+# Pool sized for concurrent FastAPI requests (default is 5 + 10 overflow).
+# Together with the raw psycopg2 pool in main.py (max 20) this stays
+# under Postgres' default max_connections of 100
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=25,
+    max_overflow=25,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    pool_use_lifo=True
+) if DATABASE_URL else None
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) if engine else None
 Base = declarative_base()
 
@@ -44,6 +54,9 @@ class UserCourse(Base):
     Stores cached course data from Canvas
     """
     __tablename__ = "user_courses"
+    __table_args__ = (
+        Index("idx_user_courses_user_course", "user_id", "course_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("canvas_credentials.user_id"), nullable=False)
@@ -63,6 +76,10 @@ class ReferenceMaterial(Base):
     Used to train AI to match professor's style
     """
     __tablename__ = "reference_materials"
+    __table_args__ = (
+        # Serves the per-user list ordered by newest upload
+        Index("idx_reference_materials_user_uploaded", "user_id", "upload_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False)  # Will link to users table later
@@ -116,6 +133,17 @@ class AIGrade(Base):
     Individual AI-generated grade for one student submission
     """
     __tablename__ = "ai_grades"
+    __table_args__ = (
+        # Grade listing per session; the leading session_id also serves
+        # session_id-only lookups, so no separate index is needed
+        Index("idx_ai_grades_session_reviewed_posted", "session_id", "reviewed", "posted_to_canvas"),
+        # Only the grades still waiting to be posted to Canvas
+        Index(
+            "idx_ai_grades_session_unposted",
+            "session_id",
+            postgresql_where=text("reviewed = true AND posted_to_canvas = false")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("ai_grading_sessions.id"), nullable=False)
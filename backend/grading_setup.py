@@ -358,8 +358,10 @@ class GradingSetupService:
                 issues.append(f"{len(orphan_assignments)} assignments not in any category")
                 suggestions.append("Move orphan assignments to appropriate categories")
 
-            # Check for empty groups
-            empty_groups = [g for g in groups if not any(a.get('assignment_group_id') == g['id'] for a in assignments)]
+            # Check for empty groups (collect used group ids once instead of
+            # rescanning every assignment for each group)
+            used_group_ids = {a.get('assignment_group_id') for a in assignments}
+            empty_groups = [g for g in groups if g['id'] not in used_group_ids]
 
             if empty_groups:
                 issues.append(f"{len(empty_groups)} empty categories (no assignments)")
@@ -9,14 +9,27 @@ Less time setting up. More time teaching.
 
 from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable
+from contextlib import contextmanager
 import os
+import asyncio
+import atexit
+import functools
+import threading
+import time
+import json
+import orjson
+import traceback
 import anthropic
+import httpx
 import requests
 import hashlib
 import secrets
+import string
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import jwt
 from sqlalchemy.orm import Session
@@ -26,7 +39,10 @@ from openai import OpenAI
 from groq import Groq
 import bcrypt
 import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
 import stripe
+from cachetools import TTLCache
 
 # ReadySetClass v2.0 imports
 from database import init_db, get_db, CanvasCredentials, UserCourse
@@ -38,14 +54,16 @@ from grading_setup import GradingSetupService, GRADING_TEMPLATES, get_template
 app = FastAPI(
     title="ReadySetClass API",
     description="AI Course Builder for Canvas - Less time setting up. More time teaching.",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Database initialization on startup
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database tables on startup"""
+    """Initialize database tables and connection pool on startup"""
     init_db()
+    init_db_pool()
 
 # CORS middleware - Allow readysetclass.app and all origins
 app.add_middleware(
@@ -72,6 +90,14 @@ JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 JWT_ALGORITHM = "HS256"
 
 # AI Clients - Support OpenAI, Groq (FREE!), and Anthropic
+# All three SDKs share one keep-alive connection pool. The short connect
+# timeout lets a provider outage fail over quickly instead of hanging
+ai_http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    timeout=httpx.Timeout(120.0, connect=5.0)
+)
+atexit.register(ai_http_client.close)
+
 openai_client = None
 groq_client = None
 anthropic_client = None
@@ -79,7 +105,7 @@ anthropic_client = None
 # Initialize OpenAI (preferred - cheap and high quality)
 if os.getenv("OPENAI_API_KEY"):
     try:
-        openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=ai_http_client)
         print("✅ OpenAI client initialized (GPT-4o-mini - $0.002/assignment)")
     except Exception as e:
         print(f"⚠️  OpenAI initialization failed: {e}")
@@ -87,7 +113,7 @@ if os.getenv("OPENAI_API_KEY"):
 # Initialize Groq (second choice - FREE!)
 if os.getenv("GROQ_API_KEY"):
     try:
-        groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"), http_client=ai_http_client)
         print("✅ Groq client initialized (Llama 3.3 70B - FREE!)")
     except Exception as e:
         print(f"⚠️  Groq initialization failed: {e}")
@@ -97,7 +123,7 @@ if os.getenv("GROQ_API_KEY"):
 # Initialize Anthropic (fallback - expensive but highest quality)
 if os.getenv("ANTHROPIC_API_KEY"):
     try:
-        anthropic_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        anthropic_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=ai_http_client)
         print("✅ Anthropic client initialized (Claude Sonnet - $0.05/assignment)")
     except Exception as e:
         print(f"⚠️  Anthropic initialization failed: {e}")
@@ -106,6 +132,18 @@ if not openai_client and not groq_client and not anthropic_client:
     print("⚠️  No AI API keys found. AI features will not work.")
     print("   Set one of: OPENAI_API_KEY, GROQ_API_KEY, or ANTHROPIC_API_KEY")
 
+# Groq models by tier: "instant" for extractive JSON (quizzes),
+# "balanced" for everything else
+MODEL_TIERS = {
+    "instant": "llama-3.1-8b-instant",
+    "balanced": "llama-3.3-70b-versatile"
+}
+
+# Responses to identical prompts, for BonitaEngine.call_ai(cache=True)
+ai_response_cache = TTLCache(maxsize=1024, ttl=3600)
+# TTLCache isn't thread-safe and call_ai runs on several worker threads
+ai_response_cache_lock = threading.Lock()
+
 # ============================================================================
 # LANGUAGE SUPPORT
 # ============================================================================
@@ -179,13 +217,11 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
 # GRADE LEVEL HELPER
 # ============================================================================
 
-def get_reading_level_instructions(grade_level: str) -> Dict[str, str]:
-    """Return detailed instructions for AI based on grade level"""
-
-    levels = {
-        'elementary-k2': {
-            'lexile': 'Lexile 0-300 (Beginning Reader)',
-            'instructions': """
+# Reading level guidance included in AI prompts, by grade level
+READING_LEVELS = {
+    'elementary-k2': {
+        'lexile': 'Lexile 0-300 (Beginning Reader)',
+        'instructions': """
 - Use VERY simple words (one or two syllables)
 - Write SHORT sentences (5-8 words max)
 - Use concrete, relatable examples (toys, pets, family, school)
@@ -194,12 +230,12 @@ def get_reading_level_instructions(grade_level: str) -> Dict[str, str]:
 - Use encouraging, friendly language
 - No complex vocabulary
 - Reading level: Ages 5-7""",
-            'example_words': 'Use words like: see, run, play, big, small, happy, sad'
-        },
+        'example_words': 'Use words like: see, run, play, big, small, happy, sad'
+    },
 
-        'elementary-35': {
-            'lexile': 'Lexile 300-700 (Elementary)',
-            'instructions': """
+    'elementary-35': {
+        'lexile': 'Lexile 300-700 (Elementary)',
+        'instructions': """
 - Use clear, simple language
 - Short to medium sentences (8-12 words)
 - Examples relevant to elementary students (playground, classrooms, cartoons)
@@ -207,12 +243,12 @@ def get_reading_level_instructions(grade_level: str) -> Dict[str, str]:
 - Step-by-step instructions
 - Positive, encouraging tone
 - Reading level: Ages 8-10""",
-            'example_words': 'Use words like: understand, explain, compare, describe, identify'
-        },
+        'example_words': 'Use words like: understand, explain, compare, describe, identify'
+    },
 
-        'middle-68': {
-            'lexile': 'Lexile 700-1000 (Middle School)',
-            'instructions': """
+    'middle-68': {
+        'lexile': 'Lexile 700-1000 (Middle School)',
+        'instructions': """
 - Age-appropriate vocabulary for pre-teens
 - Medium sentences (10-15 words)
 - Examples relevant to middle schoolers (social media, sports, music, friends)
@@ -220,12 +256,12 @@ def get_reading_level_instructions(grade_level: str) -> Dict[str, str]:
 - Clear but less simplified
 - Respectful, not condescending
 - Reading level: Ages 11-13""",
-            'example_words': 'Use words like: analyze, evaluate, interpret, demonstrate, illustrate'
-        },
+        'example_words': 'Use words like: analyze, evaluate, interpret, demonstrate, illustrate'
+    },
 
-        'high-912': {
-            'lexile': 'Lexile 1000-1300 (High School)',
-            'instructions': """
+    'high-912': {
+        'lexile': 'Lexile 1000-1300 (High School)',
+        'instructions': """
 - High school appropriate vocabulary
 - College-prep level content
 - Examples relevant to teens (college, careers, current events)
@@ -233,12 +269,12 @@ def get_reading_level_instructions(grade_level: str) -> Dict[str, str]:
 - Can assume background knowledge
 - Professional but not overly formal
 - Reading level: Ages 14-18""",
-            'example_words': 'Use words like: synthesize, critique, justify, formulate, assess'
-        },
+        'example_words': 'Use words like: synthesize, critique, justify, formulate, assess'
+    },
 
-        'college': {
-            'lexile': 'Lexile 1300+ (College/University)',
-            'instructions': """
+    'college': {
+        'lexile': 'Lexile 1300+ (College/University)',
+        'instructions': """
 - Academic/professional vocabulary
 - Complex sentence structures acceptable
 - University-level examples and concepts
@@ -246,11 +282,14 @@ def get_reading_level_instructions(grade_level: str) -> Dict[str, str]:
 - Assumes advanced background knowledge
 - Formal academic tone
 - Reading level: University students""",
-            'example_words': 'Use words like: paradigm, methodology, theoretical framework, empirical'
-        }
+        'example_words': 'Use words like: paradigm, methodology, theoretical framework, empirical'
     }
+}
+
 
-    return levels.get(grade_level, levels['college'])
+def get_reading_level_instructions(grade_level: str) -> Dict[str, str]:
+    """Return detailed instructions for AI based on grade level"""
+    return READING_LEVELS.get(grade_level, READING_LEVELS['college'])
 
 # ============================================================================
 # BONITA AI ENGINE
@@ -263,10 +302,17 @@ class BonitaEngine:
     Provider priority: OpenAI > Groq > Anthropic
     """
 
+    # Circuit breaker: after BREAKER_FAIL_MAX consecutive failures a provider
+    # is skipped for BREAKER_RESET_SECONDS, so an outage fails over at once
+    # instead of adding the SDK's retries to every request
+    BREAKER_FAIL_MAX = 5
+    BREAKER_RESET_SECONDS = 30
+
     def __init__(self):
         self.openai_client = openai_client
         self.groq_client = groq_client
         self.anthropic_client = anthropic_client
+        self.provider_failures = {}  # provider -> (consecutive failures, last failure time)
         self.cost_tracker = {
             "syllabus": 0,
             "lesson_plans": 0,
@@ -275,14 +321,88 @@ class BonitaEngine:
             "total": 0
         }
 
-    def call_ai(self, prompt: str, system: str = "") -> tuple[str, float]:
+    def call_ai(
+        self,
+        prompt: str,
+        system: str = "",
+        cache: bool = False,
+        tier: str = "balanced",
+        json_mode: bool = False,
+        validate: Optional[Callable[[str], Any]] = None
+    ) -> tuple[str, float]:
         """
         Call AI provider with automatic fallback
         Priority: OpenAI > Groq (FREE!) > Anthropic
+        cache=True reuses the response to an identical prompt for up to an
+        hour - only for factual content (quizzes), not personalized output
+        tier="instant" tries Groq's small fast model first - for extractive
+        JSON like quizzes - and falls back to the normal chain on any error
+        json_mode=True makes OpenAI/Groq return a valid JSON object (the
+        prompt must ask for a JSON object)
+        validate is called on a fresh reply before it is cached; if it
+        raises, the reply is returned but not cached
         Returns: (response_text, cost)
         """
+        if not cache:
+            return self._call_providers(prompt, system, tier, json_mode)
+
+        # Key on the exact prompt - case matters in names, code and student
+        # text - plus everything else that shapes the reply, hashed so long
+        # prompts don't bloat the cache keys
+        key_parts = f"{tier}\x00{json_mode}\x00{system}\x00{prompt}"
+        cache_key = hashlib.blake2b(key_parts.encode()).hexdigest()
+        with ai_response_cache_lock:
+            cached = ai_response_cache.get(cache_key)
+        if cached is not None:
+            print(f"✅ Cached AI response (cost: FREE!)")
+            return cached, 0.0
+
+        text, cost = self._call_providers(prompt, system, tier, json_mode)
+        if validate is not None:
+            try:
+                validate(text)
+            except Exception:
+                # Don't serve a truncated or malformed reply for the whole TTL
+                return text, cost
+        with ai_response_cache_lock:
+            ai_response_cache[cache_key] = text
+        return text, cost
+
+    def _call_providers(
+        self,
+        prompt: str,
+        system: str = "",
+        tier: str = "balanced",
+        json_mode: bool = False
+    ) -> tuple[str, float]:
+        """Send the prompt to the first AI provider that succeeds"""
+        # OpenAI and Groq support native JSON mode; Claude relies on the prompt
+        response_format = {"response_format": {"type": "json_object"}} if json_mode else {}
+
+        # Instant tier: Groq's 8B model at temperature 0 - fast,
+        # deterministic (so cacheable) and FREE!
+        if tier == "instant" and self.groq_client and not self._provider_open("groq-instant"):
+            try:
+                response = self.groq_client.chat.completions.create(
+                    model=MODEL_TIERS["instant"],
+                    messages=[
+                        {"role": "system", "content": system} if system else {"role": "system", "content": "You are a helpful assistant."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=2048,
+                    temperature=0,
+                    **response_format
+                )
+
+                self._record_result("groq-instant")
+                print(f"✅ Groq instant response (cost: FREE!)")
+                return response.choices[0].message.content, 0.0
+            except Exception as e:
+                self._record_result("groq-instant", e)
+                print(f"⚠️  Groq instant failed: {e}, trying OpenAI...")
+
         # Try OpenAI first (cheapest paid option - $0.002/assignment)
-        if self.openai_client:
+        if self.openai_client and not self._provider_open("openai"):
             try:
                 response = self.openai_client.chat.completions.create(
                     model="gpt-4o-mini",
@@ -291,7 +411,8 @@ class BonitaEngine:
                         {"role": "user", "content": prompt}
                     ],
                     max_tokens=2048,
-                    temperature=0.7
+                    temperature=0.7,
+                    **response_format
                 )
 
                 # Calculate cost for GPT-4o-mini
@@ -299,51 +420,162 @@ class BonitaEngine:
                 output_tokens = response.usage.completion_tokens
                 cost = (input_tokens / 1_000_000 * 0.15) + (output_tokens / 1_000_000 * 0.60)
 
+                self._record_result("openai")
                 print(f"✅ OpenAI response (cost: ${cost:.4f})")
                 return response.choices[0].message.content, cost
             except Exception as e:
+                self._record_result("openai", e)
                 print(f"⚠️  OpenAI failed: {e}, trying Groq...")
 
         # Try Groq second (FREE! 🎉)
-        if self.groq_client:
+        if self.groq_client and not self._provider_open("groq"):
             try:
                 response = self.groq_client.chat.completions.create(
-                    model="llama-3.3-70b-versatile",  # Fast, high quality, FREE!
+                    model=MODEL_TIERS["balanced"],  # Fast, high quality, FREE!
                     messages=[
                         {"role": "system", "content": system} if system else {"role": "system", "content": "You are a helpful assistant."},
                         {"role": "user", "content": prompt}
                     ],
                     max_tokens=2048,
-                    temperature=0.7
+                    temperature=0.7,
+                    **response_format
                 )
 
                 # Groq is FREE!
                 cost = 0.0
 
+                self._record_result("groq")
                 print(f"✅ Groq response (cost: FREE!)")
                 return response.choices[0].message.content, cost
             except Exception as e:
+                self._record_result("groq", e)
                 print(f"⚠️  Groq failed: {e}, falling back to Claude...")
 
         # Fallback to Claude (most expensive but highest quality)
-        if self.anthropic_client:
-            response = self.anthropic_client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=2048,
-                system=system,
-                messages=[{"role": "user", "content": prompt}]
-            )
+        if self.anthropic_client and not self._provider_open("anthropic"):
+            try:
+                response = self.anthropic_client.messages.create(
+                    model="claude-sonnet-4-20250514",
+                    max_tokens=2048,
+                    system=self._anthropic_system(system),
+                    messages=[{"role": "user", "content": prompt}]
+                )
+            except Exception as e:
+                self._record_result("anthropic", e)
+                raise
+            self._record_result("anthropic")
 
-            # Calculate cost for Claude
+            # Calculate cost for Claude (cache writes bill at 1.25x input,
+            # cache reads at 0.1x)
             input_tokens = response.usage.input_tokens
             output_tokens = response.usage.output_tokens
-            cost = (input_tokens / 1_000_000 * 3) + (output_tokens / 1_000_000 * 15)
+            cache_write_tokens = getattr(response.usage, "cache_creation_input_tokens", 0) or 0
+            cache_read_tokens = getattr(response.usage, "cache_read_input_tokens", 0) or 0
+            cost = (
+                (input_tokens / 1_000_000 * 3)
+                + (cache_write_tokens / 1_000_000 * 3.75)
+                + (cache_read_tokens / 1_000_000 * 0.30)
+                + (output_tokens / 1_000_000 * 15)
+            )
 
             print(f"✅ Claude response (cost: ${cost:.4f})")
             return response.content[0].text, cost
 
+        self._raise_no_provider()
+
+    def stream_ai(self, prompt: str, system: str = ""):
+        """
+        Stream AI response text as it is generated
+        Same provider priority as call_ai(); falls back to the next
+        provider only if one fails before sending any text
+        Yields: text chunks
+        """
+        messages = [
+            {"role": "system", "content": system} if system else {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ]
+
+        providers = []
+        if self.openai_client and not self._provider_open("openai"):
+            providers.append(("OpenAI", self.openai_client, "gpt-4o-mini"))
+        if self.groq_client and not self._provider_open("groq"):
+            providers.append(("Groq", self.groq_client, MODEL_TIERS["balanced"]))
+
+        for name, client, model in providers:
+            started = False
+            try:
+                stream = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=2048,
+                    temperature=0.7,
+                    stream=True
+                )
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        started = True
+                        yield chunk.choices[0].delta.content
+                self._record_result(name.lower())
+                return
+            except Exception as e:
+                if started:
+                    raise
+                self._record_result(name.lower(), e)
+                print(f"⚠️  {name} stream failed: {e}, trying next provider...")
+
+        if self.anthropic_client and not self._provider_open("anthropic"):
+            with self.anthropic_client.messages.stream(
+                model="claude-sonnet-4-20250514",
+                max_tokens=2048,
+                system=self._anthropic_system(system),
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                for text in stream.text_stream:
+                    yield text
+            return
+
+        self._raise_no_provider()
+
+    def _provider_open(self, provider: str) -> bool:
+        """True while a provider's circuit breaker is open (skip it)"""
+        failures, last_failure = self.provider_failures.get(provider, (0, 0.0))
+        return (
+            failures >= self.BREAKER_FAIL_MAX
+            and time.monotonic() - last_failure < self.BREAKER_RESET_SECONDS
+        )
+
+    def _record_result(self, provider: str, error: Optional[Exception] = None):
+        """Track consecutive provider failures for the circuit breaker"""
+        if error is None:
+            self.provider_failures.pop(provider, None)
+            return
+
+        # Client errors (bad request, auth) aren't outages - the SDKs already
+        # retry 429s and 5xx with backoff before raising
+        status = getattr(error, "status_code", None)
+        if status is not None and status < 500 and status != 429:
+            return
+
+        failures, _ = self.provider_failures.get(provider, (0, 0.0))
+        self.provider_failures[provider] = (failures + 1, time.monotonic())
+
+    def _raise_no_provider(self):
+        """Raise the right error once every provider has been tried or skipped"""
+        if self.openai_client or self.groq_client or self.anthropic_client:
+            raise Exception("AI providers are temporarily unavailable. Please try again in a moment.")
         raise Exception("No AI provider available. Please set OPENAI_API_KEY, GROQ_API_KEY, or ANTHROPIC_API_KEY")
 
+    @staticmethod
+    def _anthropic_system(system: str):
+        """
+        Send the system prompt as a cacheable block so Anthropic can reuse
+        the static prefix across calls (only kicks in past the model's
+        minimum cacheable length, 1024 tokens for Sonnet)
+        """
+        if not system:
+            return system
+        return [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+
     # Keep old method name for backward compatibility
     def call_claude(self, prompt: str, system: str = "") -> tuple[str, float]:
         """Alias for call_ai() for backward compatibility"""
@@ -501,27 +733,34 @@ Format as JSON:
 
 Return ONLY valid JSON, no markdown code blocks."""
 
-        quiz_json, cost = self.call_ai(prompt, system)
+        quiz_json, cost = self.call_ai(
+            prompt, system, cache=True, tier="instant", json_mode=True,
+            validate=self._parse_quiz_json
+        )
         self.cost_tracker["quizzes"] += cost
 
         try:
-            import json
-            # Clean up any markdown formatting
-            cleaned_json = quiz_json.strip()
-            if cleaned_json.startswith("```"):
-                # Remove markdown code blocks
-                cleaned_json = cleaned_json.split("```")[1]
-                if cleaned_json.startswith("json"):
-                    cleaned_json = cleaned_json[4:]
-                cleaned_json = cleaned_json.strip()
-
-            quiz_data = json.loads(cleaned_json)
-            return quiz_data
+            return self._parse_quiz_json(quiz_json)
         except Exception as e:
             print(f"Error parsing quiz JSON: {e}")
             print(f"Raw response: {quiz_json}")
             return {"questions": [], "error": f"Failed to parse quiz: {str(e)}"}
     
+    @staticmethod
+    def _parse_quiz_json(quiz_json: str) -> Dict:
+        """Parse a quiz reply, raising if it isn't valid JSON"""
+        # OpenAI/Groq answer in JSON mode; Claude may still wrap the
+        # JSON in a markdown code block
+        cleaned_json = quiz_json.strip()
+        if cleaned_json.startswith("```"):
+            # Remove markdown code blocks
+            cleaned_json = cleaned_json.split("```")[1]
+            if cleaned_json.startswith("json"):
+                cleaned_json = cleaned_json[4:]
+            cleaned_json = cleaned_json.strip()
+
+        return orjson.loads(cleaned_json)
+
     def generate_study_pack(self, week: int, topic: str) -> str:
         """Generate study pack with real resources (Claude + search intent)"""
         system = """You are Bonita, creating study materials for college students.
@@ -548,6 +787,79 @@ Prefer recent (2020+) resources. Cite sources properly."""
 # Initialize Bonita
 bonita = BonitaEngine()
 
+# Blocking AI SDK calls run on their own bounded pool, off the event loop
+# and separate from the threadpool FastAPI uses for everything else
+AI_MAX_CONCURRENT_CALLS = 32
+ai_executor = ThreadPoolExecutor(max_workers=AI_MAX_CONCURRENT_CALLS, thread_name_prefix="bonita")
+ai_call_slots = threading.BoundedSemaphore(AI_MAX_CONCURRENT_CALLS)
+
+
+def acquire_ai_slot():
+    """Take an AI call slot, or fail with 503 right away when all are busy"""
+    if not ai_call_slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Bonita is busy right now. Please try again in a moment.")
+
+
+def release_ai_slot(_future=None):
+    """Give an AI call slot back (usable as a future done-callback)"""
+    ai_call_slots.release()
+
+
+async def run_ai(fn, *args, **kwargs):
+    """
+    Run a blocking BonitaEngine call on the AI thread pool
+    Returns 503 right away when every slot is busy instead of queueing
+    The slot is freed when the worker finishes, not when the caller stops
+    waiting, so cancelled requests can't oversubscribe the pool
+    """
+    acquire_ai_slot()
+    try:
+        future = ai_executor.submit(functools.partial(fn, *args, **kwargs))
+    except Exception:
+        release_ai_slot()
+        raise
+    future.add_done_callback(release_ai_slot)
+    return await asyncio.wrap_future(future)
+
+
+async def sse_events(chunks):
+    """
+    Wrap streamed text chunks as Server-Sent Events
+    Takes over an AI slot the caller already holds; each chunk is pulled
+    on the AI thread pool and the slot is freed once the stream is done
+    Errors after the response has started are sent as an error event
+    """
+    chunks = iter(chunks)
+    done = object()
+    pending = None
+    try:
+        try:
+            while True:
+                pending = ai_executor.submit(next, chunks, done)
+                chunk = await asyncio.wrap_future(pending)
+                if chunk is done:
+                    break
+                yield f"data: {json.dumps(chunk)}\n\n"
+        except Exception as e:
+            print(f"❌ Streaming error: {e}")
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        # If the client went away mid-chunk, wait for that worker to finish
+        if pending is not None:
+            pending.add_done_callback(release_ai_slot)
+        else:
+            release_ai_slot()
+
+
+def stream_ai_response(prompt: str, system: str) -> StreamingResponse:
+    """Stream a Bonita reply as Server-Sent Events through the AI thread pool"""
+    acquire_ai_slot()
+    return StreamingResponse(
+        sse_events(bonita.stream_ai(prompt, system)),
+        media_type="text/event-stream"
+    )
+
 # ============================================================================
 # CANVAS API INTEGRATION
 # ============================================================================
@@ -680,6 +992,9 @@ async def connect_canvas(canvas_data: CanvasToken, user=Depends(verify_token)):
         "canvas_url": canvas_data.canvas_url
     }
 
+# AI calls one course build may have in flight on the shared AI pool
+AI_GENERATION_CONCURRENCY = 8
+
 @app.post("/api/build-course", response_model=CourseResponse)
 async def build_course(course: CourseRequest, user=Depends(verify_token)):
     """
@@ -687,33 +1002,24 @@ async def build_course(course: CourseRequest, user=Depends(verify_token)):
     This is where the magic happens!
     """
     try:
-        # 1. Generate syllabus
-        print(f"📋 Generating syllabus for {course.course_name}...")
-        syllabus = bonita.generate_syllabus(course.dict())
-        
-        # 2. Generate lesson plans
-        print(f"📚 Generating {course.weeks} lesson plans...")
-        lesson_plans = []
-        for week in range(1, course.weeks + 1):
-            topic = f"Week {week} Content"  # In production: extract from syllabus or ask user
-            lesson = bonita.generate_lesson_plan(week, topic, course.objectives[:2])
-            lesson_plans.append(lesson)
-        
-        # 3. Generate quizzes
-        print(f"🧪 Generating {course.weeks} quizzes...")
-        quizzes = []
-        for week in range(1, course.weeks + 1):
-            topic = f"Week {week}"
-            quiz = bonita.generate_quiz(week, topic)
-            quizzes.append(quiz)
-        
-        # 4. Generate study packs
-        print(f"📦 Generating {course.weeks} study packs...")
-        study_packs = []
-        for week in range(1, course.weeks + 1):
-            topic = f"Week {week}"
-            study_pack = bonita.generate_study_pack(week, topic)
-            study_packs.append(study_pack)
+        # 1-4. Generate syllabus, lesson plans, quizzes and study packs
+        # concurrently on the shared AI pool (run_ai), with at most
+        # AI_GENERATION_CONCURRENCY of this build's calls in flight
+        print(f"📋 Generating syllabus, {course.weeks} lesson plans, quizzes and study packs for {course.course_name}...")
+        semaphore = asyncio.Semaphore(AI_GENERATION_CONCURRENCY)
+
+        async def generate(fn, *args):
+            async with semaphore:
+                return await run_ai(fn, *args)
+
+        weeks = range(1, course.weeks + 1)
+        syllabus, lesson_plans, quizzes, study_packs = await asyncio.gather(
+            generate(bonita.generate_syllabus, course.dict()),
+            # In production: extract lesson topics from syllabus or ask user
+            asyncio.gather(*(generate(bonita.generate_lesson_plan, week, f"Week {week} Content", course.objectives[:2]) for week in weeks)),
+            asyncio.gather(*(generate(bonita.generate_quiz, week, f"Week {week}") for week in weeks)),
+            asyncio.gather(*(generate(bonita.generate_study_pack, week, f"Week {week}") for week in weeks))
+        )
         
         # 5. Upload to Canvas
         print(f"📤 Uploading to Canvas course {course.canvas_course_id}...")
@@ -759,6 +1065,8 @@ async def build_course(course: CourseRequest, user=Depends(verify_token)):
             created_at=datetime.utcnow().isoformat()
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -821,63 +1129,165 @@ class LoginResponse(BaseModel):
 # AUTH HELPERS
 # ============================================================================
 
-def get_db_connection():
-    """Get direct database connection"""
+# Shared pool for the raw psycopg2 endpoints (created on startup)
+db_pool = None
+DB_POOL_MAX_CONN = 20
+# getconn() raises PoolError instead of waiting when the pool is empty, so
+# requests queue here for a free connection first
+db_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_CONN)
+DB_POOL_WAIT_SECONDS = 30
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Pooled connection that remembers its server-side prepared statements"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+def get_database_url():
+    """Get DATABASE_URL with Railway's postgres:// scheme fixed"""
     DATABASE_URL = os.getenv('DATABASE_URL')
     if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
         DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    return psycopg2.connect(DATABASE_URL)
+    return DATABASE_URL
+
+def init_db_pool():
+    """Create the shared connection pool so requests skip connect + auth"""
+    global db_pool
+    DATABASE_URL = get_database_url()
+    if not DATABASE_URL or db_pool is not None:
+        return
+    try:
+        db_pool = ThreadedConnectionPool(
+            minconn=2,
+            maxconn=DB_POOL_MAX_CONN,
+            dsn=DATABASE_URL,
+            connection_factory=PooledConnection
+        )
+        print("✅ Database connection pool ready")
+    except Exception as e:
+        print(f"⚠️  Database pool initialization failed: {e}")
 
-async def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current user from session token"""
-    token = credentials.credentials
+def get_db_connection():
+    """Get direct database connection"""
+    return psycopg2.connect(get_database_url())
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def borrow_live_connection():
+    """
+    Take a connection from the pool, replacing it if the server dropped it
+    Same idea as SQLAlchemy's pool_pre_ping
+    """
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return conn
+    except psycopg2.Error:
+        db_pool.putconn(conn, close=True)
+        return db_pool.getconn()
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrow a pooled database connection for the length of a with block
+    Falls back to a direct connection when the pool isn't set up
+    """
+    if db_pool is None:
+        conn = get_db_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
 
+    if not db_pool_slots.acquire(timeout=DB_POOL_WAIT_SECONDS):
+        raise HTTPException(status_code=503, detail="Database is busy, please try again")
     try:
-        cursor.execute("""
-            SELECT s.user_id, s.expires_at, u.email, u.role, u.is_demo, u.demo_expires_at
-            FROM sessions s
-            JOIN users u ON s.user_id = u.id
-            WHERE s.session_token = %s AND u.is_active = TRUE
-        """, (token,))
+        conn = borrow_live_connection()
+        try:
+            yield conn
+        finally:
+            # putconn rolls back anything left uncommitted; broken
+            # connections are dropped instead of going back in the pool
+            db_pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        db_pool_slots.release()
+
+def get_pg_conn():
+    """
+    Borrow a pooled database connection for one request
+    Use as dependency in FastAPI endpoints that run SQL - the connection
+    is held until the response is sent
+    """
+    with pooled_connection() as conn:
+        yield conn
 
-        session = cursor.fetchone()
+def execute_prepared(cursor, name: str, statement: str, params: tuple):
+    """
+    Run a statement as a server-side prepared statement
+    PREPAREs once per pooled connection so later calls skip parse + plan
+    statement uses $1, $2... placeholders
+    """
+    prepared = getattr(cursor.connection, "prepared_statements", None)
 
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid or expired session")
+    if prepared is None or name not in prepared:
+        cursor.execute(f"PREPARE {name} AS {statement}")
+        if prepared is not None:
+            prepared.add(name)
 
-        user_id, expires_at, email, role, is_demo, demo_expires_at = session
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor.execute(f"EXECUTE {name} ({placeholders})", params)
 
-        # Check session expiry
-        if datetime.now() > expires_at:
-            raise HTTPException(status_code=401, detail="Session expired")
+def get_current_user_from_token(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """
+    Get current user from session token
+    Borrows a connection just for the lookup, so slow handlers (Canvas,
+    Stripe, AI calls) don't keep a pooled connection checked out
+    """
+    token = credentials.credentials
 
-        # Check demo expiry
-        if is_demo and demo_expires_at and datetime.now() > demo_expires_at:
-            raise HTTPException(status_code=403, detail="Demo account expired")
+    with pooled_connection() as conn:
+        with conn.cursor() as cursor:
+            # Runs on every authenticated request - keep it prepared
+            execute_prepared(cursor, "session_lookup", """
+                SELECT s.user_id, s.expires_at, u.email, u.role, u.is_demo, u.demo_expires_at
+                FROM sessions s
+                JOIN users u ON s.user_id = u.id
+                WHERE s.session_token = $1 AND u.is_active = TRUE
+            """, (token,))
 
-        return {
-            "user_id": user_id,
-            "email": email,
-            "role": role,
-            "is_demo": is_demo
-        }
+            session = cursor.fetchone()
 
-    finally:
-        cursor.close()
-        conn.close()
+    if not session:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+
+    user_id, expires_at, email, role, is_demo, demo_expires_at = session
+
+    # Check session expiry
+    if datetime.now() > expires_at:
+        raise HTTPException(status_code=401, detail="Session expired")
+
+    # Check demo expiry
+    if is_demo and demo_expires_at and datetime.now() > demo_expires_at:
+        raise HTTPException(status_code=403, detail="Demo account expired")
+
+    return {
+        "user_id": user_id,
+        "email": email,
+        "role": role,
+        "is_demo": is_demo
+    }
 
 # ============================================================================
 # AUTH ENDPOINTS
 # ============================================================================
 
 @app.post("/api/auth/login")
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, conn = Depends(get_pg_conn)):
     """Login endpoint"""
 
-    conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
@@ -950,7 +1360,6 @@ async def login(request: LoginRequest):
         raise HTTPException(status_code=500, detail="Login failed")
     finally:
         cursor.close()
-        conn.close()
 
 
 @app.post("/api/auth/logout")
@@ -983,11 +1392,11 @@ class CheckoutRequest(BaseModel):
 @app.post("/api/stripe/create-checkout")
 async def create_checkout_session(
     request: CheckoutRequest,
-    current_user = Depends(get_current_user_from_token)
+    current_user = Depends(get_current_user_from_token),
+    conn = Depends(get_pg_conn)
 ):
     """Create Stripe checkout session"""
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         # Get or create Stripe customer
@@ -1027,7 +1436,6 @@ async def create_checkout_session(
         )
 
         cursor.close()
-        conn.close()
 
         return {"checkout_url": checkout_session.url}
 
@@ -1037,7 +1445,7 @@ async def create_checkout_session(
 
 
 @app.post("/api/stripe/webhook")
-async def stripe_webhook(request: Request):
+async def stripe_webhook(request: Request, conn = Depends(get_pg_conn)):
     """Handle Stripe webhook events"""
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
@@ -1047,7 +1455,6 @@ async def stripe_webhook(request: Request):
             payload, sig_header, STRIPE_WEBHOOK_SECRET
         )
 
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         # Handle different event types
@@ -1088,7 +1495,6 @@ async def stripe_webhook(request: Request):
 
         conn.commit()
         cursor.close()
-        conn.close()
 
         return {"status": "success"}
 
@@ -1098,9 +1504,11 @@ async def stripe_webhook(request: Request):
 
 
 @app.get("/api/subscription/status")
-async def get_subscription_status(current_user = Depends(get_current_user_from_token)):
+async def get_subscription_status(
+    current_user = Depends(get_current_user_from_token),
+    conn = Depends(get_pg_conn)
+):
     """Get current subscription status"""
-    conn = get_db_connection()
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -1112,7 +1520,6 @@ async def get_subscription_status(current_user = Depends(get_current_user_from_t
 
     result = cursor.fetchone()
     cursor.close()
-    conn.close()
 
     if not result:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1131,9 +1538,11 @@ async def get_subscription_status(current_user = Depends(get_current_user_from_t
 
 
 @app.post("/api/subscription/cancel")
-async def cancel_subscription(current_user = Depends(get_current_user_from_token)):
+async def cancel_subscription(
+    current_user = Depends(get_current_user_from_token),
+    conn = Depends(get_pg_conn)
+):
     """Cancel subscription"""
-    conn = get_db_connection()
     cursor = conn.cursor()
 
     cursor.execute(
@@ -1160,19 +1569,24 @@ async def cancel_subscription(current_user = Depends(get_current_user_from_token
 
         conn.commit()
         cursor.close()
-        conn.close()
 
         return {"status": "canceled"}
 
     except Exception as e:
         cursor.close()
-        conn.close()
         raise HTTPException(status_code=500, detail=str(e))
 
 # ============================================================================
 # CANVAS INTEGRATION ENDPOINTS
 # ============================================================================
 
+# Canvas course lists per user, kept for a minute so dashboard reloads
+# don't call Canvas and re-sync user_courses every time
+courses_cache = TTLCache(maxsize=10_000, ttl=60)
+
+# Characters that can appear in a Canvas API token
+CANVAS_TOKEN_CHARS = frozenset(string.ascii_letters + string.digits + "~_-")
+
 @app.post("/api/v2/canvas/connect")
 async def connect_canvas_v2(
     request: CanvasConnectionRequest,
@@ -1184,9 +1598,8 @@ async def connect_canvas_v2(
     """
     try:
         # Aggressively clean inputs - remove ALL whitespace including hidden chars
-        import re
-        canvas_url = re.sub(r'\s+', '', request.canvas_url)  # Remove all whitespace
-        access_token = re.sub(r'\s+', '', request.access_token)  # Remove all whitespace
+        canvas_url = "".join(request.canvas_url.split())  # Remove all whitespace
+        access_token = "".join(request.access_token.split())  # Remove all whitespace
 
         print(f"\n{'='*60}")
         print(f"CANVAS CONNECTION ATTEMPT")
@@ -1215,8 +1628,8 @@ async def connect_canvas_v2(
             )
 
         # Check for suspicious characters
-        if not re.match(r'^[A-Za-z0-9~_-]+$', access_token):
-            suspicious_chars = re.findall(r'[^A-Za-z0-9~_-]', access_token)
+        suspicious_chars = [c for c in access_token if c not in CANVAS_TOKEN_CHARS]
+        if suspicious_chars:
             print(f"❌ Token contains suspicious characters: {suspicious_chars}")
             raise HTTPException(
                 status_code=400,
@@ -1265,6 +1678,9 @@ async def connect_canvas_v2(
 
             db.commit()
 
+        # Reconnecting may point at a different Canvas account
+        courses_cache.pop(user_id, None)
+
         return {
             "status": "connected",
             "canvas_url": canvas_url,
@@ -1288,6 +1704,13 @@ async def get_courses_v2(
     try:
         user_id = 1  # TODO: Use real user ID from authentication
 
+        cached = courses_cache.get(user_id)
+        if cached is not None:
+            return {
+                "courses": cached,
+                "total": len(cached)
+            }
+
         # Get Canvas credentials from database
         if not db:
             raise HTTPException(status_code=500, detail="Database not available")
@@ -1307,11 +1730,14 @@ async def get_courses_v2(
         courses = canvas_client.get_user_courses()
 
         # Cache courses in database
+        # Load the user's cached rows once instead of one SELECT per course
+        cached_courses = {
+            c.course_id: c
+            for c in db.query(UserCourse).filter_by(user_id=user_id).all()
+        }
+
         for course in courses:
-            existing = db.query(UserCourse).filter_by(
-                user_id=user_id,
-                course_id=course["id"]
-            ).first()
+            existing = cached_courses.get(course["id"])
 
             if existing:
                 existing.course_name = course["name"]
@@ -1330,6 +1756,8 @@ async def get_courses_v2(
 
         db.commit()
 
+        courses_cache[user_id] = courses
+
         return {
             "courses": courses,
             "total": len(courses)
@@ -1350,7 +1778,8 @@ async def generate_quiz_questions(request: QuizGenerateRequest):
     try:
         print(f"🧠 Generating {request.grade_level} quiz questions: {request.topic}")
 
-        quiz_data = bonita.generate_quiz(
+        quiz_data = await run_ai(
+            bonita.generate_quiz,
             week=1,
             topic=request.topic,
             description=request.description,
@@ -1368,6 +1797,8 @@ async def generate_quiz_questions(request: QuizGenerateRequest):
             "message": "Quiz questions generated! Review and upload to Canvas."
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error generating quiz: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1485,7 +1916,8 @@ async def create_quiz_v2(
 
         # Step 1: Generate quiz with Bonita AI
         print(f"🧠 Generating quiz on: {request.topic}")
-        quiz_data = bonita.generate_quiz(
+        quiz_data = await run_ai(
+            bonita.generate_quiz,
             week=1,
             topic=request.topic,
             description=request.description,
@@ -1666,7 +2098,7 @@ Make it:
 
 Return just the HTML content, no markdown code blocks."""
 
-        announcement_html, _ = bonita.call_claude(prompt, system)
+        announcement_html, _ = await run_ai(bonita.call_claude, prompt, system)
 
         # Upload to Canvas
         decrypted_token = decrypt_token(credentials.access_token_encrypted)
@@ -1699,39 +2131,30 @@ Return just the HTML content, no markdown code blocks."""
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/v2/canvas/generate-page")
-async def generate_ai_page(
-    request: AIPageRequest,
-    db: Session = Depends(get_db)
-):
-    """
-    Generate AI-enhanced course page content using Groq/OpenAI
-    Returns professional page content with proper structure
-    """
-    try:
-        print(f"🤖 Generating AI page: {request.title}")
+# Page types mapped to better descriptions for the AI prompt
+PAGE_TYPE_DESCRIPTIONS = {
+    "overview": "course or unit overview",
+    "resource_list": "resource list with links and descriptions",
+    "study_guide": "study guide with key concepts",
+    "tutorial": "tutorial or how-to guide",
+    "reading": "reading material or article",
+    "reference": "reference material",
+    "other": "informational page"
+}
 
-        # Map page types to better descriptions
-        type_descriptions = {
-            "overview": "course or unit overview",
-            "resource_list": "resource list with links and descriptions",
-            "study_guide": "study guide with key concepts",
-            "tutorial": "tutorial or how-to guide",
-            "reading": "reading material or article",
-            "reference": "reference material",
-            "other": "informational page"
-        }
 
-        page_type_desc = type_descriptions.get(request.page_type, "course page")
+def build_page_prompt(request: AIPageRequest) -> tuple[str, str]:
+    """Build (system, prompt) for AI course page generation"""
+    page_type_desc = PAGE_TYPE_DESCRIPTIONS.get(request.page_type, "course page")
 
-        # Get language name
-        language_name = LANGUAGE_MAP.get(request.language, "English")
+    # Get language name
+    language_name = LANGUAGE_MAP.get(request.language, "English")
 
-        system = """You are Bonita, an AI assistant helping college professors create course pages.
+    system = """You are Bonita, an AI assistant helping college professors create course pages.
 Your output should be well-formatted HTML suitable for Canvas LMS.
 Use clear structure, headers, lists, and proper formatting."""
 
-        prompt = f"""Create a professional course page titled: {request.title}
+    prompt = f"""Create a professional course page titled: {request.title}
 
 IMPORTANT: Generate ALL content in {language_name}.
 The entire page must be in {language_name}, including all sections, headings, and content.
@@ -1768,8 +2191,25 @@ Format the output in clean HTML suitable for Canvas LMS. Use:
 Do NOT include the page title as an <h1> or <h2> (Canvas will add that).
 Make it educational, engaging, and well-organized."""
 
+    return system, prompt
+
+
+@app.post("/api/v2/canvas/generate-page")
+async def generate_ai_page(
+    request: AIPageRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Generate AI-enhanced course page content using Groq/OpenAI
+    Returns professional page content with proper structure
+    """
+    try:
+        print(f"🤖 Generating AI page: {request.title}")
+
+        system, prompt = build_page_prompt(request)
+
         # Generate with AI
-        generated_content, cost = bonita.call_ai(prompt, system)
+        generated_content, cost = await run_ai(bonita.call_ai, prompt, system)
 
         print(f"✅ Page generated (cost: ${cost:.4f})")
 
@@ -1779,11 +2219,27 @@ Make it educational, engaging, and well-organized."""
             "cost": cost
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error generating page: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v2/canvas/generate-page/stream")
+async def stream_ai_page(request: AIPageRequest):
+    """
+    Stream AI-generated course page content as it is written
+    Server-Sent Events: each event is a JSON-encoded text chunk,
+    the stream ends with [DONE]
+    """
+    print(f"🤖 Streaming AI page: {request.title}")
+
+    system, prompt = build_page_prompt(request)
+
+    return stream_ai_response(prompt, system)
+
+
 @app.post("/api/v2/canvas/page")
 async def create_page_v2(
     request: PageRequest,
@@ -1835,41 +2291,32 @@ async def create_page_v2(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/v2/canvas/generate-assignment")
-async def generate_ai_assignment(
-    request: AIAssignmentRequest,
-    db: Session = Depends(get_db)
-):
-    """
-    Generate AI-enhanced assignment content using Bonita
-    Returns professional assignment description with instructions, objectives, rubric
-    """
-    try:
-        print(f"🤖 Generating AI assignment: {request.topic}")
+# Assignment types mapped to better descriptions for the AI prompt
+ASSIGNMENT_TYPE_DESCRIPTIONS = {
+    "essay": "essay or written paper",
+    "discussion": "discussion post or forum response",
+    "project": "project or presentation",
+    "research": "research assignment",
+    "case_study": "case study analysis",
+    "lab": "lab or practical work",
+    "reflection": "reflection assignment",
+    "group": "group collaborative assignment",
+    "other": "assignment"
+}
 
-        # Map assignment types to better descriptions
-        type_descriptions = {
-            "essay": "essay or written paper",
-            "discussion": "discussion post or forum response",
-            "project": "project or presentation",
-            "research": "research assignment",
-            "case_study": "case study analysis",
-            "lab": "lab or practical work",
-            "reflection": "reflection assignment",
-            "group": "group collaborative assignment",
-            "other": "assignment"
-        }
 
-        assignment_type_desc = type_descriptions.get(request.assignment_type, "assignment")
+def build_assignment_prompt(request: AIAssignmentRequest) -> tuple[str, str]:
+    """Build (system, prompt) for AI assignment generation"""
+    assignment_type_desc = ASSIGNMENT_TYPE_DESCRIPTIONS.get(request.assignment_type, "assignment")
 
-        # Get language name
-        language_name = LANGUAGE_MAP.get(request.language, "English")
+    # Get language name
+    language_name = LANGUAGE_MAP.get(request.language, "English")
 
-        system = """You are Bonita, an AI assistant helping college professors create high-quality assignments.
+    system = """You are Bonita, an AI assistant helping college professors create high-quality assignments.
 Your output should be professional, clear, and properly formatted for Canvas LMS.
 Use HTML formatting with headers, lists, and proper structure."""
 
-        prompt = f"""Create a professional college assignment on: {request.topic}
+    prompt = f"""Create a professional college assignment on: {request.topic}
 
 IMPORTANT: Generate ALL content in {language_name}.
 The entire response must be in {language_name}, including title, description, objectives, instructions, deliverables, and rubric.
@@ -1904,8 +2351,25 @@ Keep it professional but engaging. Make instructions clear and actionable.
 Do NOT include the assignment title as a heading (it will be added separately).
 Focus on creating content that helps students succeed."""
 
+    return system, prompt
+
+
+@app.post("/api/v2/canvas/generate-assignment")
+async def generate_ai_assignment(
+    request: AIAssignmentRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Generate AI-enhanced assignment content using Bonita
+    Returns professional assignment description with instructions, objectives, rubric
+    """
+    try:
+        print(f"🤖 Generating AI assignment: {request.topic}")
+
+        system, prompt = build_assignment_prompt(request)
+
         # Generate with Bonita AI
-        generated_content, cost = bonita.call_claude(prompt, system)
+        generated_content, cost = await run_ai(bonita.call_claude, prompt, system)
 
         print(f"✅ Assignment generated (cost: ${cost:.4f})")
 
@@ -1915,11 +2379,27 @@ Focus on creating content that helps students succeed."""
             "cost": cost
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error generating assignment: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v2/canvas/generate-assignment/stream")
+async def stream_ai_assignment(request: AIAssignmentRequest):
+    """
+    Stream AI-generated assignment content as it is written
+    Server-Sent Events: each event is a JSON-encoded text chunk,
+    the stream ends with [DONE]
+    """
+    print(f"🤖 Streaming AI assignment: {request.topic}")
+
+    system, prompt = build_assignment_prompt(request)
+
+    return stream_ai_response(prompt, system)
+
+
 @app.post("/api/v2/canvas/assignment")
 async def create_assignment_v2(
     request: AssignmentRequest,
@@ -1956,7 +2436,7 @@ Include:
 
 Format in HTML for Canvas."""
 
-            description, _ = bonita.call_claude(prompt, system)
+            description, _ = await run_ai(bonita.call_claude, prompt, system)
 
         # Upload to Canvas
         decrypted_token = decrypt_token(credentials.access_token_encrypted)
@@ -2108,7 +2588,7 @@ Create an engaging discussion post that:
 
 Keep it concise but meaningful."""
 
-        discussion_html, _ = bonita.call_claude(prompt, system)
+        discussion_html, _ = await run_ai(bonita.call_claude, prompt, system)
 
         # Upload to Canvas
         decrypted_token = decrypt_token(credentials.access_token_encrypted)
@@ -2152,6 +2632,31 @@ from docx import Document
 import io
 
 
+def extract_pdf_text(file_content: bytes) -> str:
+    """Extract text from an uploaded PDF"""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    return "".join(page.extract_text() + "\n" for page in pdf_reader.pages)
+
+
+def extract_docx_text(file_content: bytes) -> str:
+    """Extract text from an uploaded DOCX"""
+    doc = Document(io.BytesIO(file_content))
+    return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
+
+
+def extract_txt_text(file_content: bytes) -> str:
+    """Decode an uploaded TXT file"""
+    return file_content.decode('utf-8')
+
+
+# Accepted reference material file types: extension -> (extractor, error message)
+REFERENCE_TEXT_EXTRACTORS = {
+    'pdf': (extract_pdf_text, "Failed to extract text from PDF"),
+    'docx': (extract_docx_text, "Failed to extract text from DOCX"),
+    'txt': (extract_txt_text, "Failed to read TXT file")
+}
+
+
 @app.post("/api/v2/reference-materials/upload")
 async def upload_reference_material(
     file: UploadFile = File(...),
@@ -2167,7 +2672,7 @@ async def upload_reference_material(
 
         # Validate file type
         file_ext = file.filename.split('.')[-1].lower()
-        if file_ext not in ['pdf', 'docx', 'txt']:
+        if file_ext not in REFERENCE_TEXT_EXTRACTORS:
             raise HTTPException(
                 status_code=400,
                 detail="Invalid file type. Accepted: PDF, DOCX, TXT"
@@ -2177,43 +2682,14 @@ async def upload_reference_material(
         file_content = await file.read()
 
         # Extract text based on file type
-        extracted_text = ""
-
-        if file_ext == 'pdf':
-            # Extract text from PDF
-            try:
-                pdf_file = io.BytesIO(file_content)
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                for page in pdf_reader.pages:
-                    extracted_text += page.extract_text() + "\n"
-            except Exception as e:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to extract text from PDF: {str(e)}"
-                )
-
-        elif file_ext == 'docx':
-            # Extract text from DOCX
-            try:
-                docx_file = io.BytesIO(file_content)
-                doc = Document(docx_file)
-                for paragraph in doc.paragraphs:
-                    extracted_text += paragraph.text + "\n"
-            except Exception as e:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to extract text from DOCX: {str(e)}"
-                )
-
-        elif file_ext == 'txt':
-            # Extract text from TXT
-            try:
-                extracted_text = file_content.decode('utf-8')
-            except Exception as e:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to read TXT file: {str(e)}"
-                )
+        extractor, error_message = REFERENCE_TEXT_EXTRACTORS[file_ext]
+        try:
+            extracted_text = extractor(file_content)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"{error_message}: {str(e)}"
+            )
 
         # Validate extracted text
         if not extracted_text or len(extracted_text.strip()) < 100:
@@ -2392,9 +2868,11 @@ Generate an engaging discussion post that includes:
 
 Format in HTML for Canvas. Make it engaging and encourage meaningful dialogue."""
 
-        content, cost = bonita.call_ai(prompt, system)
+        content, cost = await run_ai(bonita.call_ai, prompt, system)
         print(f"✅ Discussion generated (cost: ${cost:.4f})")
         return {"status": "success", "generated_content": content, "cost": cost}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2449,9 +2927,11 @@ Format in clean HTML suitable for Canvas. Use:
 
 Make it comprehensive, professional, and student-friendly."""
 
-        content, cost = bonita.call_ai(prompt, system)
+        content, cost = await run_ai(bonita.call_ai, prompt, system)
         print(f"✅ Syllabus generated (cost: ${cost:.4f})")
         return {"status": "success", "generated_content": content, "cost": cost}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2781,7 +3261,7 @@ def generate_demo_email():
     return f"demo-{random_id}@readysetclass.com"
 
 @app.post("/api/demo/create")
-async def create_demo_account(db: Session = Depends(get_db)):
+async def create_demo_account(db: Session = Depends(get_db), conn = Depends(get_pg_conn)):
     """
     Create a temporary demo account
 
@@ -2809,8 +3289,6 @@ async def create_demo_account(db: Session = Depends(get_db)):
         # Calculate expiration (24 hours from now)
         expires_at = datetime.utcnow() + timedelta(hours=24)
 
-        # Get database connection
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         # Create user
@@ -2831,7 +3309,6 @@ async def create_demo_account(db: Session = Depends(get_db)):
         user_id = cursor.fetchone()[0]
         conn.commit()
         cursor.close()
-        conn.close()
 
         print(f"✅ Created demo account: {email} (expires in 24h)")
 
@@ -2851,7 +3328,6 @@ async def create_demo_account(db: Session = Depends(get_db)):
         }
 
     except Exception as e:
-        import traceback
         error_trace = traceback.format_exc()
         print(f"❌ Error creating demo: {e}")
         print(f"Full traceback:\n{error_trace}")
@@ -2859,7 +3335,10 @@ async def create_demo_account(db: Session = Depends(get_db)):
 
 
 @app.delete("/api/demo/cleanup")
-async def cleanup_expired_demos(current_user=Depends(get_current_user_from_token)):
+async def cleanup_expired_demos(
+    current_user=Depends(get_current_user_from_token),
+    conn=Depends(get_pg_conn)
+):
     """
     Cleanup expired demo accounts (admin only)
     Deletes demo accounts older than 24 hours
@@ -2869,7 +3348,6 @@ async def cleanup_expired_demos(current_user=Depends(get_current_user_from_token
         raise HTTPException(status_code=403, detail="Admin access required")
 
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -2882,7 +3360,6 @@ async def cleanup_expired_demos(current_user=Depends(get_current_user_from_token
         deleted = cursor.fetchall()
         conn.commit()
         cursor.close()
-        conn.close()
 
         return {
             "deleted_count": len(deleted),
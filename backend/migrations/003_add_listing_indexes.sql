@@ -0,0 +1,23 @@
+-- ReadySetClass Listing Indexes
+-- Migration 003: Index per-user listings so they avoid a full scan + sort
+--
+-- These tables are created by the app's init_db() on startup, which may not
+-- have run yet on a fresh database. Each index is skipped if its table is
+-- missing; create_all() builds the same indexes from the models in that case.
+
+DO $$
+BEGIN
+    -- Reference materials list: WHERE user_id = ? ORDER BY upload_date DESC
+    -- (read as a backward index scan, no sort step)
+    IF to_regclass('reference_materials') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_reference_materials_user_uploaded ON reference_materials(user_id, upload_date);
+    END IF;
+
+    -- Canvas course cache lookups by (user_id, course_id)
+    IF to_regclass('user_courses') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_user_courses_user_course ON user_courses(user_id, course_id);
+    END IF;
+END $$;
+
+-- Success message
+SELECT 'Listing indexes created successfully!' as message;
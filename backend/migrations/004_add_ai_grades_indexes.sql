@@ -0,0 +1,19 @@
+-- ReadySetClass AI Grades Indexes
+-- Migration 004: Index the per-session grade queries used by the grading routes
+--
+-- ai_grades is created by the app's init_db() on startup. If it doesn't
+-- exist yet the indexes are skipped; create_all() builds them from the model.
+
+DO $$
+BEGIN
+    IF to_regclass('ai_grades') IS NOT NULL THEN
+        -- Grade listing, progress count and review queries: WHERE session_id = ? [AND reviewed = ?]
+        CREATE INDEX IF NOT EXISTS idx_ai_grades_session_reviewed_posted ON ai_grades(session_id, reviewed, posted_to_canvas);
+
+        -- Post to Canvas: reviewed grades of a session that haven't been posted yet
+        CREATE INDEX IF NOT EXISTS idx_ai_grades_session_unposted ON ai_grades(session_id) WHERE reviewed = true AND posted_to_canvas = false;
+    END IF;
+END $$;
+
+-- Success message
+SELECT 'AI grades indexes created successfully!' as message;
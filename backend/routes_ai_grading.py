@@ -5,13 +5,18 @@ FastAPI endpoints for AI-powered grading workflow
 """
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Literal, Optional
+from dataclasses import dataclass
 from datetime import datetime
 import logging
+import orjson
+from cachetools import TTLCache
 
-from database import get_db, AIGradingSession, AIGrade, CanvasCredentials
+from database import get_db, SessionLocal, AIGradingSession, AIGrade, CanvasCredentials
 from ai_grading.grading_engine import AIGradingEngine
 from ai_grading.canvas_integration import CanvasGradingIntegration
 from canvas_auth import decrypt_token
@@ -20,6 +25,10 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/ai-grading", tags=["ai-grading"])
 
+# Canvas "ready to grade" lists keyed by (user_id, course_id). Polled by
+# the dashboard, so a short TTL saves most Canvas round-trips
+ready_to_grade_cache = TTLCache(maxsize=10_000, ttl=60)
+
 
 # ============================================================================
 # Request/Response Models
@@ -38,14 +47,6 @@ class ReviewGradeRequest(BaseModel):
     adjustments: Optional[Dict] = None
 
 
-class SessionStatusResponse(BaseModel):
-    session_id: int
-    status: str
-    total_submissions: int
-    graded_count: int
-    progress_percent: float
-
-
 # ============================================================================
 # Helper Functions
 # ============================================================================
@@ -60,44 +61,106 @@ def get_current_user_id() -> int:
     return 1
 
 
+@dataclass
+class CanvasContext:
+    """
+    Current user plus their decrypted Canvas credentials
+    """
+    user_id: int
+    canvas_url: str
+    canvas_token: str
+
+
+def get_canvas_context(db: Session = Depends(get_db)) -> CanvasContext:
+    """
+    Resolve the current user and their Canvas credentials once per request
+    Use as dependency in endpoints that call Canvas
+    """
+    user_id = get_current_user_id()
+
+    canvas_creds = db.query(
+        CanvasCredentials.canvas_url,
+        CanvasCredentials.access_token_encrypted
+    ).filter(CanvasCredentials.user_id == user_id).first()
+
+    if not canvas_creds:
+        raise HTTPException(status_code=400, detail="Canvas not connected")
+
+    return CanvasContext(
+        user_id=user_id,
+        canvas_url=canvas_creds.canvas_url,
+        canvas_token=decrypt_token(canvas_creds.access_token_encrypted)
+    )
+
+
+def get_owned_grade(db: Session, grade_id: int, user_id: int):
+    """
+    Load a grade together with its session in one query
+
+    Raises 404 if the grade doesn't exist and 403 if the session
+    belongs to another user
+    """
+    row = db.query(AIGrade, AIGradingSession).join(
+        AIGradingSession, AIGrade.session_id == AIGradingSession.id
+    ).filter(AIGrade.id == grade_id).first()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Grade not found")
+
+    grade, session = row
+
+    # Verify ownership through session
+    if session.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    return grade, session
+
+
 async def grade_submissions_background(
     session_id: int,
     submissions: List[Dict],
     rubric: Dict,
-    preferences: Dict,
-    db: Session
+    preferences: Dict
 ):
     """
     Background task to grade all submissions with AI
+    Opens its own DB session since the request's session is closed by then
     """
+    # No connection is checked out until the first query, so none is
+    # held while the LLM calls are in flight
+    db = SessionLocal()
     try:
         logger.info(f"Starting background grading for session {session_id}")
 
         # Initialize grading engine
         engine = AIGradingEngine(rubric=rubric, preferences=preferences)
 
+        # Save each chunk's grades as soon as it is graded, so the status
+        # endpoint's count climbs while the rest are still in flight
+        def save_chunk(chunk: List[Dict], chunk_results: List[Dict]):
+            db.bulk_insert_mappings(AIGrade, [
+                {
+                    "session_id": session_id,
+                    "student_id": result.get("student_id", ""),
+                    "student_name": result.get("student_name"),
+                    "submission_id": result.get("submission_id", ""),
+                    "submission_text": submission.get("submission_text", ""),
+                    "ai_total_score": result.get("total_score"),
+                    "ai_rubric_scores": result.get("rubric_scores"),
+                    "ai_feedback": result.get("feedback"),
+                    "ai_criterion_feedback": result.get("criterion_feedback"),
+                    "ai_confidence": result.get("confidence", "low"),
+                    "ai_flags": result.get("flags", [])
+                }
+                for submission, result in zip(chunk, chunk_results)
+            ])
+            db.commit()
+
         # Grade all submissions in parallel
-        results = await engine.grade_batch(submissions)
+        results = await engine.grade_batch(submissions, on_chunk_graded=save_chunk)
 
         logger.info(f"Graded {len(results)} submissions for session {session_id}")
 
-        # Save results to database
-        for result in results:
-            grade = AIGrade(
-                session_id=session_id,
-                student_id=result.get("student_id", ""),
-                student_name=result.get("student_name"),
-                submission_id=result.get("submission_id", ""),
-                submission_text=result.get("submission_text", ""),
-                ai_total_score=result.get("total_score"),
-                ai_rubric_scores=result.get("rubric_scores"),
-                ai_feedback=result.get("feedback"),
-                ai_criterion_feedback=result.get("criterion_feedback"),
-                ai_confidence=result.get("confidence", "low"),
-                ai_flags=result.get("flags", [])
-            )
-            db.add(grade)
-
         # Update session
         session = db.query(AIGradingSession).filter_by(id=session_id).first()
         if session:
@@ -123,10 +186,13 @@ async def grade_submissions_background(
     except Exception as e:
         logger.error(f"Error in background grading: {e}")
         # Update session to error state
+        db.rollback()
         session = db.query(AIGradingSession).filter_by(id=session_id).first()
         if session:
             session.status = "error"
             db.commit()
+    finally:
+        db.close()
 
 
 # ============================================================================
@@ -137,7 +203,8 @@ async def grade_submissions_background(
 async def start_grading_session(
     request: StartGradingRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ctx: CanvasContext = Depends(get_canvas_context)
 ):
     """
     Start a new AI grading session
@@ -147,22 +214,13 @@ async def start_grading_session(
     3. Start background task to grade all submissions
     4. Return session ID for progress tracking
     """
-    user_id = get_current_user_id()
-
-    # Get Canvas credentials
-    canvas_creds = db.query(CanvasCredentials).filter_by(user_id=user_id).first()
-
-    if not canvas_creds:
-        raise HTTPException(status_code=400, detail="Canvas not connected")
+    user_id = ctx.user_id
 
     try:
-        # Decrypt Canvas token
-        canvas_token = decrypt_token(canvas_creds.access_token_encrypted)
-
         # Initialize Canvas integration
         canvas = CanvasGradingIntegration(
-            canvas_url=canvas_creds.canvas_url,
-            canvas_token=canvas_token
+            canvas_url=ctx.canvas_url,
+            canvas_token=ctx.canvas_token
         )
 
         # Fetch submissions
@@ -194,6 +252,7 @@ async def start_grading_session(
         db.add(session)
         db.commit()
         db.refresh(session)
+        ready_to_grade_cache.pop((user_id, request.course_id), None)
 
         logger.info(f"Created grading session {session.id} for {len(submissions)} submissions")
 
@@ -203,8 +262,7 @@ async def start_grading_session(
             session_id=session.id,
             submissions=submissions,
             rubric=request.rubric,
-            preferences=request.preferences,
-            db=db
+            preferences=request.preferences
         )
 
         return {
@@ -221,7 +279,7 @@ async def start_grading_session(
         raise HTTPException(status_code=500, detail=f"Failed to start grading: {str(e)}")
 
 
-@router.get("/sessions/{session_id}/status", response_model=SessionStatusResponse)
+@router.get("/sessions/{session_id}/status")
 async def get_session_status(
     session_id: int,
     db: Session = Depends(get_db)
@@ -231,76 +289,123 @@ async def get_session_status(
     """
     user_id = get_current_user_id()
 
-    session = db.query(AIGradingSession).filter_by(
-        id=session_id,
-        user_id=user_id
-    ).first()
+    # Count saved grades directly rather than trusting the graded_count
+    # column, which is only written once the background task finishes
+    session = db.query(
+        AIGradingSession.id,
+        AIGradingSession.status,
+        AIGradingSession.total_submissions,
+        func.count(AIGrade.id).label("graded_count")
+    ).outerjoin(
+        AIGrade, AIGrade.session_id == AIGradingSession.id
+    ).filter(
+        AIGradingSession.id == session_id,
+        AIGradingSession.user_id == user_id
+    ).group_by(AIGradingSession.id).first()
 
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
     progress_percent = 0
-    if session.total_submissions > 0:
+    if session.total_submissions:
         progress_percent = (session.graded_count / session.total_submissions) * 100
 
-    return SessionStatusResponse(
-        session_id=session.id,
-        status=session.status,
-        total_submissions=session.total_submissions,
-        graded_count=session.graded_count,
-        progress_percent=round(progress_percent, 2)
-    )
+    # Polled every few seconds by the progress UI - return a plain dict
+    # instead of building a model that FastAPI would validate again
+    return {
+        "session_id": session.id,
+        "status": session.status,
+        "total_submissions": session.total_submissions,
+        "graded_count": session.graded_count,
+        "progress_percent": round(progress_percent, 2)
+    }
+
+
+# Columns for the review grid (scores and flags only)
+GRADE_SUMMARY_COLUMNS = (
+    AIGrade.id,
+    AIGrade.student_id,
+    AIGrade.student_name,
+    AIGrade.submission_id,
+    AIGrade.ai_total_score,
+    AIGrade.ai_rubric_scores,
+    AIGrade.ai_confidence,
+    AIGrade.ai_flags,
+    AIGrade.reviewed,
+    AIGrade.final_score
+)
+
+# Summary plus the feedback text shown in the review pane
+GRADE_FULL_COLUMNS = GRADE_SUMMARY_COLUMNS + (
+    AIGrade.ai_feedback,
+    AIGrade.ai_criterion_feedback,
+    AIGrade.final_feedback
+)
+
+
+def stream_session_grades(session_id: int, session_info: Dict, columns: tuple):
+    """
+    Yield the grades response as JSON, encoding 100 grades at a time
+    Opens its own DB session since the request's is closed before streaming
+    """
+    db = SessionLocal()
+    try:
+        yield b'{"session":' + orjson.dumps(session_info) + b',"grades":['
+
+        result = db.execute(
+            select(*columns).where(
+                AIGrade.session_id == session_id
+            ).order_by(AIGrade.id).execution_options(yield_per=100)
+        )
+
+        separator = b""
+        for batch in result.partitions():
+            yield separator + b",".join(orjson.dumps(row._asdict()) for row in batch)
+            separator = b","
+
+        yield b"]}"
+    finally:
+        db.close()
 
 
 @router.get("/sessions/{session_id}/grades")
 async def get_session_grades(
     session_id: int,
+    fields: Literal["full", "summary"] = "full",
     db: Session = Depends(get_db)
 ):
     """
     Get all grades for a session (for review interface)
+    Streamed so large sessions aren't built and encoded in memory at once
+
+    ?fields=summary leaves out the feedback text for the review grid
     """
     user_id = get_current_user_id()
 
-    session = db.query(AIGradingSession).filter_by(
-        id=session_id,
-        user_id=user_id
+    session = db.query(
+        AIGradingSession.id,
+        AIGradingSession.status,
+        AIGradingSession.assignment_title,
+        AIGradingSession.average_score,
+        AIGradingSession.total_submissions,
+        AIGradingSession.flagged_count,
+        AIGradingSession.reviewed_count
+    ).filter(
+        AIGradingSession.id == session_id,
+        AIGradingSession.user_id == user_id
     ).first()
 
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    grades = db.query(AIGrade).filter_by(session_id=session_id).all()
-
-    return {
-        "session": {
-            "id": session.id,
-            "status": session.status,
-            "assignment_title": session.assignment_title,
-            "average_score": session.average_score,
-            "total_submissions": session.total_submissions,
-            "flagged_count": session.flagged_count,
-            "reviewed_count": session.reviewed_count
-        },
-        "grades": [
-            {
-                "id": g.id,
-                "student_id": g.student_id,
-                "student_name": g.student_name,
-                "submission_id": g.submission_id,
-                "ai_total_score": g.ai_total_score,
-                "ai_rubric_scores": g.ai_rubric_scores,
-                "ai_feedback": g.ai_feedback,
-                "ai_criterion_feedback": g.ai_criterion_feedback,
-                "ai_confidence": g.ai_confidence,
-                "ai_flags": g.ai_flags,
-                "reviewed": g.reviewed,
-                "final_score": g.final_score,
-                "final_feedback": g.final_feedback
-            }
-            for g in grades
-        ]
-    }
+    return StreamingResponse(
+        stream_session_grades(
+            session_id,
+            session._asdict(),
+            GRADE_SUMMARY_COLUMNS if fields == "summary" else GRADE_FULL_COLUMNS
+        ),
+        media_type="application/json"
+    )
 
 
 @router.put("/grades/{grade_id}/review")
@@ -314,19 +419,15 @@ async def review_grade(
     """
     user_id = get_current_user_id()
 
-    grade = db.query(AIGrade).filter_by(id=grade_id).first()
-
-    if not grade:
-        raise HTTPException(status_code=404, detail="Grade not found")
-
-    # Verify ownership through session
-    session = db.query(AIGradingSession).filter_by(
-        id=grade.session_id,
-        user_id=user_id
-    ).first()
+    grade, session = get_owned_grade(db, grade_id, user_id)
 
-    if not session:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+    # Only a first review changes the session's reviewed count. Flip the
+    # flag with a conditional UPDATE so that when two reviews of the same
+    # grade race, exactly one of them sees rowcount == 1
+    first_review = db.query(AIGrade).filter(
+        AIGrade.id == grade.id,
+        AIGrade.reviewed == False
+    ).update({AIGrade.reviewed: True}, synchronize_session=False) == 1
 
     # Update grade
     grade.reviewed = True
@@ -341,11 +442,9 @@ async def review_grade(
     if request.adjustments:
         grade.professor_adjustments = request.adjustments
 
-    # Update session reviewed count
-    session.reviewed_count = db.query(AIGrade).filter_by(
-        session_id=session.id,
-        reviewed=True
-    ).count()
+    # Update session reviewed count in SQL so concurrent reviews don't race
+    if first_review:
+        session.reviewed_count = func.coalesce(AIGradingSession.reviewed_count, 0) + 1
 
     db.commit()
 
@@ -366,18 +465,7 @@ async def regenerate_grade(
     """
     user_id = get_current_user_id()
 
-    grade = db.query(AIGrade).filter_by(id=grade_id).first()
-
-    if not grade:
-        raise HTTPException(status_code=404, detail="Grade not found")
-
-    session = db.query(AIGradingSession).filter_by(
-        id=grade.session_id,
-        user_id=user_id
-    ).first()
-
-    if not session:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+    grade, session = get_owned_grade(db, grade_id, user_id)
 
     try:
         # Re-grade the submission
@@ -412,12 +500,13 @@ async def regenerate_grade(
 @router.post("/sessions/{session_id}/post-to-canvas")
 async def post_grades_to_canvas(
     session_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ctx: CanvasContext = Depends(get_canvas_context)
 ):
     """
     Post all reviewed grades to Canvas
     """
-    user_id = get_current_user_id()
+    user_id = ctx.user_id
 
     session = db.query(AIGradingSession).filter_by(
         id=session_id,
@@ -427,8 +516,15 @@ async def post_grades_to_canvas(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # Get all reviewed grades that haven't been posted
-    grades = db.query(AIGrade).filter_by(
+    # Get all reviewed grades that haven't been posted (only the columns
+    # sent to Canvas - rows are marked posted with a bulk UPDATE below)
+    grades = db.query(
+        AIGrade.student_id,
+        AIGrade.final_score,
+        AIGrade.ai_total_score,
+        AIGrade.final_feedback,
+        AIGrade.ai_feedback
+    ).filter_by(
         session_id=session_id,
         reviewed=True,
         posted_to_canvas=False
@@ -437,20 +533,11 @@ async def post_grades_to_canvas(
     if not grades:
         raise HTTPException(status_code=400, detail="No reviewed grades to post")
 
-    # Get Canvas credentials
-    canvas_creds = db.query(CanvasCredentials).filter_by(user_id=user_id).first()
-
-    if not canvas_creds:
-        raise HTTPException(status_code=400, detail="Canvas not connected")
-
     try:
-        # Decrypt token
-        canvas_token = decrypt_token(canvas_creds.access_token_encrypted)
-
         # Initialize Canvas integration
         canvas = CanvasGradingIntegration(
-            canvas_url=canvas_creds.canvas_url,
-            canvas_token=canvas_token
+            canvas_url=ctx.canvas_url,
+            canvas_token=ctx.canvas_token
         )
 
         # Prepare grades for posting
@@ -471,18 +558,43 @@ async def post_grades_to_canvas(
         )
 
         # Update grades as posted
-        for grade in grades:
-            if any(r.get("student_id") == grade.student_id for r in results["success"]):
-                grade.posted_to_canvas = True
-                grade.posted_at = datetime.utcnow()
+        now = datetime.utcnow()
+        success_ids = {r["student_id"] for r in results["success"]}
+        newly_posted = 0
+        if success_ids:
+            # rowcount only includes rows this request flipped from unposted,
+            # so overlapping posts of the same grades aren't counted twice
+            newly_posted = db.query(AIGrade).filter(
+                AIGrade.session_id == session_id,
+                AIGrade.reviewed == True,
+                AIGrade.posted_to_canvas == False,
+                AIGrade.student_id.in_(success_ids)
+            ).update(
+                {AIGrade.posted_to_canvas: True, AIGrade.posted_at: now},
+                synchronize_session=False
+            )
 
-        # Update session
-        session.posted_count = results["success_count"]
-        if session.reviewed_count == session.posted_count:
-            session.status = "posted"
-            session.posted_at = datetime.utcnow()
+        # Update session atomically - add to posted_count rather than
+        # overwrite it, so concurrent posts can't lose each other's counts
+        new_posted_count = func.coalesce(AIGradingSession.posted_count, 0) + newly_posted
+        all_posted = new_posted_count >= AIGradingSession.reviewed_count
+        db.query(AIGradingSession).filter(
+            AIGradingSession.id == session_id
+        ).update(
+            {
+                AIGradingSession.posted_count: new_posted_count,
+                AIGradingSession.status: case(
+                    (all_posted, "posted"), else_=AIGradingSession.status
+                ),
+                AIGradingSession.posted_at: case(
+                    (all_posted, now), else_=AIGradingSession.posted_at
+                )
+            },
+            synchronize_session=False
+        )
 
         db.commit()
+        ready_to_grade_cache.pop((user_id, session.course_id), None)
 
         return {
             "success_count": results["success_count"],
@@ -498,36 +610,33 @@ async def post_grades_to_canvas(
 @router.get("/assignments/ready-to-grade")
 async def get_assignments_ready_to_grade(
     course_id: Optional[str] = None,
-    db: Session = Depends(get_db)
+    ctx: CanvasContext = Depends(get_canvas_context)
 ):
     """
     Get list of assignments that have submissions ready to grade
 
     Used for the dashboard "Ready to Grade" section
     """
-    user_id = get_current_user_id()
-
-    canvas_creds = db.query(CanvasCredentials).filter_by(user_id=user_id).first()
-
-    if not canvas_creds:
-        raise HTTPException(status_code=400, detail="Canvas not connected")
-
     try:
-        canvas_token = decrypt_token(canvas_creds.access_token_encrypted)
-        canvas = CanvasGradingIntegration(
-            canvas_url=canvas_creds.canvas_url,
-            canvas_token=canvas_token
-        )
-
         if course_id:
-            # Get assignments for specific course
-            assignments = canvas.get_course_assignments(course_id=course_id)
-
-            # Filter to only those needing grading
-            ready_to_grade = [
-                a for a in assignments
-                if a.get("needs_grading_count", 0) > 0
-            ]
+            cache_key = (ctx.user_id, course_id)
+            ready_to_grade = ready_to_grade_cache.get(cache_key)
+
+            if ready_to_grade is None:
+                canvas = CanvasGradingIntegration(
+                    canvas_url=ctx.canvas_url,
+                    canvas_token=ctx.canvas_token
+                )
+
+                # Get assignments for specific course
+                assignments = canvas.get_course_assignments(course_id=course_id)
+
+                # Filter to only those needing grading
+                ready_to_grade = [
+                    a for a in assignments
+                    if a.get("needs_grading_count", 0) > 0
+                ]
+                ready_to_grade_cache[cache_key] = ready_to_grade
 
             return {"assignments": ready_to_grade}
 
@@ -2,10 +2,13 @@
 Run database migrations for ReadySetClass
 """
 import os
+import glob
 import psycopg2
 
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
 def run_migrations():
-    """Execute all migration files"""
+    """Execute all pending migration files in one transaction"""
 
     DATABASE_URL = os.getenv('DATABASE_URL')
 
@@ -19,27 +22,47 @@ def run_migrations():
 
     print("🔄 Connecting to database...")
     conn = psycopg2.connect(DATABASE_URL)
-    cursor = conn.cursor()
 
-    print("🔄 Running migration: 001_create_auth_tables.sql")
+    try:
+        # psycopg2's connection context manager commits on success and
+        # rolls back everything on error, so migrations apply all-or-nothing
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                    "filename TEXT PRIMARY KEY, "
+                    "applied_at TIMESTAMP DEFAULT NOW())"
+                )
+                cursor.execute("SELECT filename FROM schema_migrations")
+                applied = {row[0] for row in cursor.fetchall()}
 
-    # Read and execute migration
-    migration_path = os.path.join(os.path.dirname(__file__), 'migrations', '001_create_auth_tables.sql')
+                pending = [
+                    path for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '*.sql')))
+                    if os.path.basename(path) not in applied
+                ]
 
-    with open(migration_path, 'r') as f:
-        migration_sql = f.read()
+                if not pending:
+                    print("✅ No pending migrations")
+                    return
 
-    try:
-        cursor.execute(migration_sql)
-        conn.commit()
-        print("✅ Migration completed successfully!")
+                for migration_path in pending:
+                    filename = os.path.basename(migration_path)
+                    print(f"🔄 Running migration: {filename}")
+
+                    with open(migration_path, 'r') as f:
+                        cursor.execute(f.read())
+
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (filename) VALUES (%s)",
+                        (filename,)
+                    )
+
+        print(f"✅ Applied {len(pending)} migration(s) successfully!")
 
     except Exception as e:
-        print(f"❌ Migration failed: {e}")
-        conn.rollback()
+        print(f"❌ Migration failed, no changes applied: {e}")
 
     finally:
-        cursor.close()
         conn.close()
 
 if __name__ == "__main__":
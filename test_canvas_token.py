@@ -2,9 +2,12 @@
 """
 Canvas Token Tester
 Quick script to test Canvas API token directly
+Set CANVAS_DEBUG=1 to print the full response headers and body
 """
 
+import os
 import requests
+from requests.adapters import HTTPAdapter
 import sys
 
 def test_canvas_token():
@@ -42,22 +45,34 @@ def test_canvas_token():
 
     try:
         print(f"\nSending request to: {canvas_url}/api/v1/users/self")
-        response = requests.get(
-            f"{canvas_url}/api/v1/users/self",
-            headers=headers,
-            timeout=10
-        )
-
-        print(f"\nHTTP Status Code: {response.status_code}")
-        print(f"\nResponse Headers:")
-        for key, value in response.headers.items():
-            print(f"  {key}: {value}")
-
-        print(f"\nResponse Body:")
-        print(response.text)
-
-        if response.status_code == 200:
-            user_data = response.json()
+        # Same session setup as the Canvas client, so follow-up calls
+        # to the same host reuse the TLS connection
+        with requests.Session() as session:
+            session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+            session.headers.update(headers)
+            # stream=True leaves the body unread until we ask for it, so
+            # failures that only need the status code never decode it
+            response = session.get(
+                f"{canvas_url}/api/v1/users/self",
+                stream=True,
+                timeout=10
+            )
+
+            print(f"\nHTTP Status Code: {response.status_code}")
+
+            # Full header and body dump only when debugging
+            if os.getenv("CANVAS_DEBUG"):
+                print(f"\nResponse Headers:")
+                for key, value in response.headers.items():
+                    print(f"  {key}: {value}")
+
+                print(f"\nResponse Body:")
+                print(response.text)
+
+            user_data = response.json() if response.status_code == 200 else None
+            response.close()
+
+        if user_data is not None:
             print(f"\n{'='*60}")
             print("✅ SUCCESS!")
             print(f"{'='*60}")